@@ -1,21 +1,204 @@
 """Contains the Board class"""
 
 import copy
-import itertools
 import Piece
 import Move
+import Zobrist
+import Evaluation
 from Piece import PieceType as p_type
 from Piece import PieceColour as Colour
 # Tkinter graphics package
 from tkinter import *
 
+# Bitboards are ints with one bit per square. Square (x, y) is bit x + 8*y,
+# so bit 0 is a8 (the top left square as drawn) and bit 63 is h1.
+FULL = (1 << 64) - 1
+RANK_8 = 0xFF
+RANK_1 = RANK_8 << 56
+# The light squares, starting with a8 (bit 0)
+LIGHT_SQUARES = sum(1 << sq for sq in range(64)
+                    if ((sq & 7) + (sq >> 3)) % 2 == 0)
+
+KNIGHT_OFFSETS = ((1, 2), (-1, 2), (2, 1), (-2, 1),
+                  (2, -1), (-2, -1), (1, -2), (-1, -2))
+KING_OFFSETS = ((1, 1), (1, 0), (1, -1), (0, 1),
+                (0, -1), (-1, 1), (-1, 0), (-1, -1))
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def _build_leaper_table(offsets):
+    """Return a list of 64 bitboards of the squares reachable from each
+    square by one of the passed (dx, dy) offsets."""
+
+    table = []
+
+    for sq in range(64):
+        x, y = sq & 7, sq >> 3
+        attacks = 0
+
+        for dx, dy in offsets:
+            if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+                attacks |= 1 << (x + dx + 8*(y + dy))
+
+        table.append(attacks)
+
+    return table
+
+
+def _build_ray_squares(dx, dy):
+    """Return a list giving, for each square, a tuple of the squares met
+    moving from it in direction (dx, dy), nearest first."""
+
+    table = []
+
+    for sq in range(64):
+        x, y = (sq & 7) + dx, (sq >> 3) + dy
+        ray = []
+
+        while 0 <= x < 8 and 0 <= y < 8:
+            ray.append(x + 8*y)
+            x += dx
+            y += dy
+
+        table.append(tuple(ray))
+
+    return table
+
+# Lookup tables, indexed by square
+KNIGHT_ATTACKS = _build_leaper_table(KNIGHT_OFFSETS)
+KING_ATTACKS = _build_leaper_table(KING_OFFSETS)
+
+# Squares attacked by a pawn on each square, indexed [colour][square] as for
+# Board.piece_bb. White pawns move up the board (in the negative y direction).
+PAWN_ATTACKS = [None, _build_leaper_table(((1, -1), (-1, -1))),
+                _build_leaper_table(((1, 1), (-1, 1)))]
+
+# Squares along each direction from each square, indexed [(dx, dy)][square],
+# as ordered tuples (RAY_SQUARES) and as bitboards (RAYS)
+RAY_SQUARES = {}
+RAYS = {}
+
+for _dirn in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+    RAY_SQUARES[_dirn] = _build_ray_squares(*_dirn)
+    RAYS[_dirn] = [sum(1 << sq for sq in ray) for ray in RAY_SQUARES[_dirn]]
+
+# Rays are split by whether they run towards higher or lower square indices,
+# since this decides whether the nearest blocker is the lowest or highest bit
+_ROOK_RAYS_UP = (RAYS[(1, 0)], RAYS[(0, 1)])
+_ROOK_RAYS_DOWN = (RAYS[(-1, 0)], RAYS[(0, -1)])
+_BISHOP_RAYS_UP = (RAYS[(1, 1)], RAYS[(-1, 1)])
+_BISHOP_RAYS_DOWN = (RAYS[(-1, -1)], RAYS[(1, -1)])
+
+# (rays, runs towards higher square indices) for each slider direction
+_ROOK_RAY_TABLES = tuple((rays, True) for rays in _ROOK_RAYS_UP) + \
+    tuple((rays, False) for rays in _ROOK_RAYS_DOWN)
+_BISHOP_RAY_TABLES = tuple((rays, True) for rays in _BISHOP_RAYS_UP) + \
+    tuple((rays, False) for rays in _BISHOP_RAYS_DOWN)
+
+
+def _ray_attacks(sq, occupied, rays_up, rays_down):
+    attacks = 0
+
+    for rays in rays_up:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+
+    for rays in rays_down:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    """Return the squares attacked by a rook on square sq.
+
+    Each ray stops at (and includes) the first occupied square it meets.
+
+    """
+
+    return _ray_attacks(sq, occupied, _ROOK_RAYS_UP, _ROOK_RAYS_DOWN)
+
+
+def bishop_attacks(sq, occupied):
+    """Return the squares attacked by a bishop on square sq.
+
+    Each ray stops at (and includes) the first occupied square it meets.
+
+    """
+
+    return _ray_attacks(sq, occupied, _BISHOP_RAYS_UP, _BISHOP_RAYS_DOWN)
+
+
+# Pieces a pawn may be promoted to, most valuable first
+PROMOTION_TYPES = (p_type.queen, p_type.rook, p_type.bishop, p_type.knight)
+
+# Types of the pieces which may move, king first as in move generation
+MOVING_TYPES = (p_type.king, p_type.pawn, p_type.knight, p_type.bishop,
+                p_type.rook, p_type.queen)
+
+# Rough piece values indexed by PieceType, used to put captures of the most
+# valuable victim by the least valuable attacker first (MVV-LVA)
+MVV_LVA_VALUES = (0, 10, 9, 3, 3, 5, 1)
+
+# Piece values in centipawns used by static exchange evaluation (see
+# Board.see). The king is worth more than everything else together, so an
+# exchange never ends with a king being taken.
+SEE_VALUES = (0, 20000) + Evaluation.PIECE_VALUES[2:]
+
+# The order in which pieces join an exchange, least valuable first
+SEE_ORDER = (p_type.pawn, p_type.knight, p_type.bishop, p_type.rook,
+             p_type.queen, p_type.king)
+
+# The shared piece for each letter used in FEN, eg. "N" for a white knight
+FEN_PIECES = {}
+for _colour in (Colour.white, Colour.black):
+    for _type in (p_type.king, p_type.queen, p_type.bishop, p_type.knight,
+                  p_type.rook, p_type.pawn):
+        _piece = Piece.make_piece(_type, _colour)
+        FEN_PIECES[_piece.get_san()] = _piece
+
 
 class Board:
 
-    """Contains a 2d array of pieces and methods for making/verifying moves.
+    """Holds the position as bitboards and methods for making/verifying moves.
 
     Attributes:
-        - piece_array:  a 2d list of pieces
+        - squares:  a list of the 64 pieces on the board, indexed by x + 8*y
+        - piece_bb:  bitboards of the pieces on the board, indexed by
+                     [colour][piece type]. piece_bb[colour][PieceType.blank]
+                     holds every piece of that colour. The outer list has
+                     three entries so that it can be indexed directly with
+                     PieceColour.white (1) and PieceColour.black (-1).
+        - king_squares:  the square index (x + 8*y) of the king of each
+                         colour, or None if it has no king, indexed by
+                         colour like piece_bb
+        - piece_counts:  the number of pieces of each type and colour,
+                         indexed [colour][type] like piece_bb, with
+                         piece_counts[colour][PieceType.blank] the total
+                         for the colour
+        - zobrist:  the XOR of the Zobrist.PIECE_KEYS for every piece on the
+                    board. Gamestate adds the side to move, castling rights
+                    and en passant square to this to make a full hash.
+        - score:  the material and piece-square score of the position in
+                  centipawns from white's side, the sum of the
+                  Evaluation.SQUARE_SCORES for every piece on the board
+        - piece_array:  a read-only 2d view of squares indexed [x][y], for
+                        code written against the old 2d list of pieces
+
+    All changes to the position go through place_piece, which keeps squares,
+    piece_bb, piece_counts, king_squares, zobrist and score in step
+    (set_forsyth builds them all at once instead, to load positions
+    quickly). The colour bitboards piece_bb[colour][PieceType.blank] act as
+    each side's piece list, so move generation and check detection only
+    visit occupied squares.
 
     """
 
@@ -26,10 +209,6 @@ class Board:
         """Create clear board."""
         self.clear()
 
-        self.ver_hor_list = [(1, 0), (-1, 0), (0, 1), (0, -1)]
-
-        self.diag_list = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-
     def draw_board(self, canvas):
         """Draw the current state of the board on a canvas.
 
@@ -57,69 +236,77 @@ class Board:
         sq_width = int(canvas["width"])/8
 
         # draw all pieces on the board
-        for i in range(8):
-            for j in range(8):
+        for colour in (Colour.white, Colour.black):
+            for i, j in self.get_piece_posns(colour):
 
-                self.piece_array[i][j].draw(canvas, i*sq_width, j*sq_width)
+                self.squares[i + 8*j].draw(canvas, i*sq_width, j*sq_width)
 
     def copy(self):
-        return copy.deepcopy(self)
+        """Return an independent copy of the board.
+
+        Pieces are immutable and shared, so only the containers are copied.
+
+        """
+
+        board = copy.copy(self)
+        board.squares = list(self.squares)
+        board.piece_bb = [None, list(self.piece_bb[Colour.white]),
+                          list(self.piece_bb[Colour.black])]
+        board.piece_counts = [None, list(self.piece_counts[Colour.white]),
+                              list(self.piece_counts[Colour.black])]
+        board.king_squares = list(self.king_squares)
+        board.piece_array = _PieceArray(board.squares)
+
+        return board
 
     def clear(self):
-        """Initialise piece_array as an 8 x 8 array of blank pieces."""
-        self.piece_array = [[Piece.Piece() for i in range(Board.SIZE)]
-                            for i in range(Board.SIZE)]
+        """Remove every piece from the board."""
+        self.squares = [Piece.BLANK] * Board.SIZE**2
+        self.piece_bb = [None, [0]*7, [0]*7]
+        self.piece_counts = [None, [0]*7, [0]*7]
+        self.king_squares = [None, None, None]
+        self.zobrist = 0
+        self.score = 0
+        self.piece_array = _PieceArray(self.squares)
 
     def setup(self):
         """Set the board to the arrangement for the beginning of a game."""
 
         self.clear()
         for x in range(Board.SIZE):
-            self.piece_array[x][1] = Piece.Pawn(Colour.black)
-            self.piece_array[x][6] = Piece.Pawn(Colour.white)
-
-        self.piece_array[0][0] = Piece.Rook(Colour.black)
-        self.piece_array[7][0] = Piece.Rook(Colour.black)
-        self.piece_array[1][0] = Piece.Knight(Colour.black)
-        self.piece_array[6][0] = Piece.Knight(Colour.black)
-        self.piece_array[2][0] = Piece.Bishop(Colour.black)
-        self.piece_array[5][0] = Piece.Bishop(Colour.black)
-        self.piece_array[3][0] = Piece.Queen(Colour.black)
-        self.piece_array[4][0] = Piece.King(Colour.black)
-
-        self.piece_array[0][7] = Piece.Rook(Colour.white)
-        self.piece_array[7][7] = Piece.Rook(Colour.white)
-        self.piece_array[1][7] = Piece.Knight(Colour.white)
-        self.piece_array[6][7] = Piece.Knight(Colour.white)
-        self.piece_array[2][7] = Piece.Bishop(Colour.white)
-        self.piece_array[5][7] = Piece.Bishop(Colour.white)
-        self.piece_array[3][7] = Piece.Queen(Colour.white)
-        self.piece_array[4][7] = Piece.King(Colour.white)
+            self.place_piece(x, 1, p_type.pawn, Colour.black)
+            self.place_piece(x, 6, p_type.pawn, Colour.white)
+
+        back_rank = [p_type.rook, p_type.knight, p_type.bishop, p_type.queen,
+                     p_type.king, p_type.bishop, p_type.knight, p_type.rook]
+
+        for x, piece_type in enumerate(back_rank):
+            self.place_piece(x, 0, piece_type, Colour.black)
+            self.place_piece(x, 7, piece_type, Colour.white)
 
     def test_setup(self):
 
         for x in range(Board.SIZE):
-            self.piece_array[x][1] = Piece.Pawn(Colour.black)
-            self.piece_array[x][6] = Piece.Pawn(Colour.white)
-
-        self.piece_array[0][0] = Piece.Rook(Colour.black)
-        self.piece_array[7][3] = Piece.Rook(Colour.black)
-        self.piece_array[1][4] = Piece.Knight(Colour.black)
-        self.piece_array[6][7] = Piece.Knight(Colour.black)
-        self.piece_array[2][1] = Piece.Bishop(Colour.black)
-        self.piece_array[5][0] = Piece.Bishop(Colour.black)
-        self.piece_array[3][2] = Piece.Queen(Colour.black)
-        self.piece_array[4][0] = Piece.King(Colour.black)
-
-        self.piece_array[0][4] = Piece.Rook(Colour.white)
-        self.piece_array[7][7] = Piece.Rook(Colour.white)
-        self.piece_array[1][7] = Piece.Knight(Colour.white)
-        self.piece_array[6][5] = Piece.Knight(Colour.white)
-        self.piece_array[2][7] = Piece.Bishop(Colour.white)
-        self.piece_array[5][5] = Piece.Bishop(Colour.white)
-        self.piece_array[3][6] = Piece.Queen(Colour.white)
-        self.piece_array[4][2] = Piece.King(Colour.white)
-
+            self.place_piece(x, 1, p_type.pawn, Colour.black)
+            self.place_piece(x, 6, p_type.pawn, Colour.white)
+
+        self.place_piece(0, 0, p_type.rook, Colour.black)
+        self.place_piece(7, 3, p_type.rook, Colour.black)
+        self.place_piece(1, 4, p_type.knight, Colour.black)
+        self.place_piece(6, 7, p_type.knight, Colour.black)
+        self.place_piece(2, 1, p_type.bishop, Colour.black)
+        self.place_piece(5, 0, p_type.bishop, Colour.black)
+        self.place_piece(3, 2, p_type.queen, Colour.black)
+        self.place_piece(4, 0, p_type.king, Colour.black)
+
+        self.place_piece(0, 4, p_type.rook, Colour.white)
+        self.place_piece(7, 7, p_type.rook, Colour.white)
+        self.place_piece(1, 7, p_type.knight, Colour.white)
+        self.place_piece(6, 5, p_type.knight, Colour.white)
+        self.place_piece(2, 7, p_type.bishop, Colour.white)
+        self.place_piece(5, 5, p_type.bishop, Colour.white)
+        self.place_piece(3, 6, p_type.queen, Colour.white)
+        self.place_piece(4, 2, p_type.king, Colour.white)
 
     def make_move(self, move):
         """Adjust the state of the board to reflect the passed move.
@@ -136,19 +323,26 @@ class Board:
         if move.en_passant:
             self.remove_piece(*move.en_passant_posn)
 
-        piece = self.piece_array[move.start_posn[0]][move.start_posn[1]]
+        piece = self.squares[move.start_posn[0] + 8*move.start_posn[1]]
 
         self.remove_piece(*move.start_posn)
         self.place_piece(move.end_posn[0], move.end_posn[1],
-                         piece.type, piece.colour)
+                         move.promotion or piece.type, piece.colour)
 
     def takeback_move(self, move, taken_piece):
+        """Undo the passed move, which must be the last move made.
+
+        Args:
+            - move:  a Move object
+            - taken_piece:  the piece which was on move.end_posn before the
+                            move was made (or None)
+        """
 
         if move.castle:
             self.takeback_castle(move)
             return
 
-        piece = self.piece_array[move.end_posn[0]][move.end_posn[1]]
+        piece = self.squares[move.end_posn[0] + 8*move.end_posn[1]]
 
         if move.en_passant:
             if piece.colour == Colour.white:
@@ -163,8 +357,13 @@ class Board:
         
 
         self.remove_piece(*move.end_posn)
-        self.place_piece(move.start_posn[0], move.start_posn[1],
-                         piece.type, piece.colour)
+
+        if move.promotion:
+            self.place_piece(move.start_posn[0], move.start_posn[1],
+                             p_type.pawn, piece.colour)
+        else:
+            self.place_piece(move.start_posn[0], move.start_posn[1],
+                             piece.type, piece.colour)
 
         if taken_piece is not None:
 
@@ -196,7 +395,8 @@ class Board:
         rook_y = move.start_posn[1]
 
         # Move the king
-        self.make_move(Move.Move(move.start_posn, move.end_posn))
+        self.remove_piece(*move.start_posn)
+        self.place_piece(move.end_posn[0], move.end_posn[1], p_type.king, col)
 
         # Move the rook
         self.remove_piece(rook_from_x, rook_y)
@@ -204,7 +404,7 @@ class Board:
 
     def takeback_castle(self, move):
 
-        piece = self.piece_array[move.start_posn[0]][move.start_posn[1]]
+        piece = self.squares[move.end_posn[0] + 8*move.end_posn[1]]
         col = piece.colour
 
         # If king is moving to the right
@@ -220,7 +420,9 @@ class Board:
         rook_y = move.start_posn[1]
 
         # Move the king
-        self.takeback_move(Move.Move(move.start_posn, move.end_posn), None)
+        self.remove_piece(*move.end_posn)
+        self.place_piece(move.start_posn[0], move.start_posn[1], p_type.king,
+                         col)
 
         # Move the rook
         self.remove_piece(rook_to_x, rook_y)
@@ -239,18 +441,19 @@ class Board:
         """
 
         if (piece_colour == Colour.white):
-            y = 0
+            back_rank = RANK_8
         else:
-            y = 7
+            back_rank = RANK_1
 
-        for i in range(Board.SIZE):
-            if self.piece_array[i][y] == Piece.Pawn(piece_colour):
-                self.place_piece(i, y, piece_type, piece_colour)
-                break
-        else:
+        pawns = self.piece_bb[piece_colour][p_type.pawn] & back_rank
+
+        if not pawns:
             raise TypeError(
                 "Promote Pawn called, but no pawn is available for promotion.")
 
+        sq = (pawns & -pawns).bit_length() - 1
+        self.place_piece(sq & 7, sq >> 3, piece_type, piece_colour)
+
     ###########################################################################
     ############################# HELPER FUNCTIONS ############################
     ###########################################################################
@@ -264,20 +467,17 @@ class Board:
 
         Returns None if indeices out of bounds
         """
-        
-        try:
-            piece = self.piece_array[x][y]
-        except IndexError:
-            return None
 
-        if(not self.is_square(x, y)):
+        if not (0 <= x < 8 and 0 <= y < 8):
             return None
 
-        return piece
+        return self.squares[x + 8*y]
 
     def place_piece(self, x, y, piece_type, piece_colour):
         """Place a piece of the passed type at the passed location.
 
+        Any piece already on the square is replaced.
+
         Args:
             - x, y:  ints specifying the position on the board to place piece
             - type:  a member of the PieceType enum
@@ -286,7 +486,46 @@ class Board:
         Will raise IndexError if the indices are not valid.
         """
 
-        self.piece_array[x][y] = Piece.make_piece(piece_type, piece_colour)
+        if not (0 <= x < 8 and 0 <= y < 8):
+            raise IndexError("No square at " + str((x, y)))
+
+        sq = x + 8*y
+        bit = 1 << sq
+
+        old = self.squares[sq]
+        if old.type != p_type.blank:
+            bitboards = self.piece_bb[old.colour]
+            bitboards[old.type] ^= bit
+            bitboards[p_type.blank] ^= bit
+            self.zobrist ^= Zobrist.PIECE_KEYS[old.colour][old.type][sq]
+            self.score -= Evaluation.SQUARE_SCORES[old.colour][old.type][sq]
+
+            counts = self.piece_counts[old.colour]
+            counts[old.type] -= 1
+            counts[p_type.blank] -= 1
+
+            if old.type == p_type.king:
+                # Fall back on any other king of the colour
+                kings = bitboards[p_type.king]
+                self.king_squares[old.colour] = (kings.bit_length() - 1
+                                                 if kings else None)
+
+        self.squares[sq] = Piece.make_piece(piece_type, piece_colour)
+
+        if piece_type != p_type.blank:
+            bitboards = self.piece_bb[piece_colour]
+            bitboards[piece_type] |= bit
+            bitboards[p_type.blank] |= bit
+            self.zobrist ^= Zobrist.PIECE_KEYS[piece_colour][piece_type][sq]
+            self.score += \
+                Evaluation.SQUARE_SCORES[piece_colour][piece_type][sq]
+
+            counts = self.piece_counts[piece_colour]
+            counts[piece_type] += 1
+            counts[p_type.blank] += 1
+
+            if piece_type == p_type.king:
+                self.king_squares[piece_colour] = sq
 
     def remove_piece(self, x, y):
         """Remove the piece at the passed location.
@@ -297,7 +536,38 @@ class Board:
         Will raise IndexError if the indices are not valid.
         """
 
-        self.piece_array[x][y] = Piece.Piece()
+        self.place_piece(x, y, p_type.blank, Colour.blank)
+
+    def get_king_posn(self, piece_colour):
+        """Return the (x, y) position of the passed colour's king, or None
+        if it has no king."""
+
+        sq = self.king_squares[piece_colour]
+
+        if sq is None:
+            return None
+
+        return (sq & 7, sq >> 3)
+
+    def get_piece_posns(self, piece_colour):
+        """Return a list of the (x, y) positions of the passed colour's
+        pieces."""
+
+        pieces = self.piece_bb[piece_colour][p_type.blank]
+        posns = []
+
+        while pieces:
+            lsb = pieces & -pieces
+            pieces ^= lsb
+            sq = lsb.bit_length() - 1
+            posns.append((sq & 7, sq >> 3))
+
+        return posns
+
+    def get_occupied(self):
+        """Return a bitboard of every occupied square."""
+        return (self.piece_bb[Colour.white][p_type.blank]
+                | self.piece_bb[Colour.black][p_type.blank])
 
     def search_direction(self, x, y, up_down, left_right, no_legal=False):
         """Move along the board in a given direction and return information.
@@ -334,42 +604,27 @@ class Board:
                 (x, y) in the given direction (or empty list if no_legal is 
                 true)
 
-        Will raise ValueError if up_down == left_right == 0, or IndexError if
-        x and y do not refer to a physical square on the board.
+        Will raise ValueError if (left_right, up_down) is not one of the eight
+        unit directions, or IndexError if x and y do not refer to a physical
+        square on the board.
 
         """
 
-        #John, Not sure what these functions are doing. Commented them out
-        #for now as quite slow especially as this function is called a lot.
-
-        #if(up_down != 0):
-        #    up_down = int(up_down/abs(up_down))
-
-        #if(left_right != 0):
-        #    left_right = int(left_right/abs(left_right))
-
-        #if up_down == 0 and left_right == 0:
-        #    raise ValueError
-
-        #if not self.is_square(x, y):
-        #    raise IndexError
+        try:
+            ray = RAY_SQUARES[(left_right, up_down)][x + 8*y]
+        except KeyError:
+            raise ValueError("Not a direction: " + str((left_right, up_down)))
 
         num_squares = 0
         found_piece = None
         move_list = []
 
-        new_x = x
-        new_y = y
-
-        new_x += left_right
-        new_y += up_down
-
-        while(self.is_square(new_x, new_y)):
+        for sq in ray:
 
-            piece_at_move = self.piece_array[new_x][new_y]
+            piece_at_move = self.squares[sq]
 
             if not no_legal:
-                move = Move.Move((x, y), (new_x, new_y))
+                move = Move.Move((x, y), (sq & 7, sq >> 3))
 
                 if self.is_possible_valid_move(move):
                     move_list.append(move)
@@ -379,8 +634,6 @@ class Board:
                 break
 
             num_squares += 1
-            new_x += left_right
-            new_y += up_down
 
         return (num_squares, found_piece, move_list)
 
@@ -406,7 +659,7 @@ class Board:
         if move.castle:
             return self.is_possible_castle_move(move)
 
-        piece_moving = self.piece_array[move.start_posn[0]][move.start_posn[1]]
+        piece_moving = self.squares[move.start_posn[0] + 8*move.start_posn[1]]
 
         piece_at_move = self.get_piece(*move.end_posn)
 
@@ -432,28 +685,40 @@ class Board:
         if move.castle:
             return self.is_valid_castle_move(move)
 
-        piece_moving = self.piece_array[move.start_posn[0]][move.start_posn[1]]
-        taken_piece = self.get_piece(*move.end_posn)
+        start = move.start_posn[0] + 8*move.start_posn[1]
+        end = move.end_posn[0] + 8*move.end_posn[1]
+        piece_moving = self.squares[start]
 
-        #SLOW
-        #new_board = self.copy()
-        #new_board.make_move(move)
+        if piece_moving.type == p_type.king:
+            king_sq = end
+        else:
+            king_sq = self.king_squares[piece_moving.colour]
 
-        #if new_board.is_in_check(piece_moving.colour):
-        #    return False
+            if king_sq is None:
+                return True
 
-        #FAST
-        self.make_move(move)
+        captured = 1 << end
+        if move.en_passant:
+            captured |= 1 << (move.en_passant_posn[0]
+                              + 8*move.en_passant_posn[1])
 
-        if self.is_in_check(piece_moving.colour):
+        return self._is_safe(start, end, king_sq, piece_moving.colour,
+                             self.get_occupied(), captured)
 
-            self.takeback_move(move, taken_piece)
+    def _is_safe(self, start, end, king_sq, piece_colour, occupied, captured):
+        """Return true if moving a piece of piece_colour from square start to
+        square end, capturing the pieces on the squares of the bitboard
+        captured, leaves its king (on king_sq after the move) out of check.
 
-            return False
+        Rather than making the move, this works out the occupied squares
+        after it and looks for attacks on the king, ignoring captured pieces.
 
-        self.takeback_move(move, taken_piece)
+        """
 
-        return True
+        occupied = (occupied & ~((1 << start) | captured)) | (1 << end)
+
+        return not self._is_attacked(king_sq, -piece_colour, occupied,
+                                     captured)
 
     def is_possible_castle_move(self, move):
         """Return true if the passed move is a castle move and is possible.
@@ -474,12 +739,8 @@ class Board:
         if king.type != p_type.king:
             return False
 
-        if king.colour == Colour.white:
-            y = 7
-            friendly_rook = Piece.Rook(Colour.white)
-        elif king.colour == Colour.black:
-            y = 0
-            friendly_rook = Piece.Rook(Colour.black)
+        y = 7 if king.colour == Colour.white else 0
+        friendly_rook = Piece.make_piece(p_type.rook, king.colour)
 
         # If king is not at correct position for castling
         if move.start_posn != (4, y):
@@ -521,24 +782,23 @@ class Board:
         if not move.castle:
             return False
 
-        king = self.piece_array[move.start_posn[0]][move.start_posn[1]]
+        x, y = move.start_posn
+        king = self.squares[x + 8*y]
 
-        if self.is_in_check(king.colour):
+        if king.type != p_type.king:
             return False
 
-        if (move.end_posn[0] > move.start_posn[0]):
+        if move.end_posn[0] > x:
             # Castling King's side
-
-            search_results = self.search_direction(
-                move.start_posn[0], move.start_posn[1], 0, 1)
-            if len(search_results[2]) != 2:
-                return False
+            passed = (x, x + 1, x + 2)
         else:
-            # Castling Queen's side
+            # Castling Queen's side. The king passes over d and c only, so
+            # the b square need not be safe, just empty (checked by
+            # is_possible_castle_move)
+            passed = (x, x - 1, x - 2)
 
-            search_results = self.search_direction(
-                move.start_posn[0], move.start_posn[1], 0, -1)
-            if len(search_results[2]) != 3:
+        for passed_x in passed:
+            if self.is_square_attacked(passed_x, y, -king.colour):
                 return False
 
         return True
@@ -549,7 +809,7 @@ class Board:
 
     def is_take_move(self, move):
         """Return true if the passed move is a taking move."""
-        piece_at_move = self.piece_array[move.end_posn[0]][move.end_posn[1]]
+        piece_at_move = self.squares[move.end_posn[0] + 8*move.end_posn[1]]
 
         return piece_at_move.type != p_type.blank
 
@@ -567,7 +827,7 @@ class Board:
 
         """
 
-        piece_to_move = self.piece_array[x][y]
+        piece_to_move = self.squares[x + 8*y]
 
         if piece_to_move.type == p_type.king:
             return self.get_king_moves(x, y)
@@ -584,6 +844,524 @@ class Board:
 
         return []
 
+    def get_legal_moves(self, piece_colour, promotions=False):
+        """Return a list of all the legal moves for the passed colour.
+
+        As with get_piece_moves, castle moves and en passant moves are not
+        included. Pins and checks are worked out once for the whole position,
+        so only king moves need to be tested individually.
+
+        Args:
+            - piece_colour:  a member of the Piece.PieceColour enum
+            - promotions:  if true, a pawn move to the back rank is given once
+                           for each piece it can be promoted to (see
+                           get_legal_codes)
+
+        """
+
+        return [Move.Move.from_code(code)
+                for code in self.get_legal_codes(piece_colour,
+                                                 promotions=promotions)]
+
+    def get_legal_codes(self, piece_colour, codes=None, promotions=False):
+        """Return the move codes of all the legal moves for a colour.
+
+        This is get_legal_moves without building a Move for each move; see
+        Move.encode for the format.
+
+        Args:
+            - piece_colour:  a member of the Piece.PieceColour enum
+            - codes:  an array (see Move.new_code_list) to append the codes
+                      to. A new one is made if this is not passed.
+            - promotions:  if true, a pawn move onto the back rank becomes
+                           four moves, one for each piece it may promote to
+
+        """
+
+        if codes is None:
+            codes = Move.new_code_list()
+
+        enemies = self.piece_bb[-piece_colour][p_type.blank]
+
+        for start, targets, promotion_types in self._iter_targets(
+                piece_colour, promotions):
+            self._append_codes(codes, start, targets, enemies,
+                               promotion_types)
+
+        return codes
+
+    def iter_codes(self, piece_colour, promotions=False):
+        """Yield the move codes of the legal moves for a colour one at a time.
+
+        This gives the same moves as get_legal_codes, but the moves of each
+        piece are only worked out when the ones before have been used, so a
+        caller which stops early (eg. to see if any move exists) does not
+        pay for the rest.
+
+        Args:
+            - piece_colour:  a member of the Piece.PieceColour enum
+            - promotions:  as for get_legal_codes
+
+        """
+
+        enemies = self.piece_bb[-piece_colour][p_type.blank]
+
+        for start, targets, promotion_types in self._iter_targets(
+                piece_colour, promotions):
+            codes = []
+            self._append_codes(codes, start, targets, enemies,
+                               promotion_types)
+            yield from codes
+
+    def iter_moves(self, piece_colour, promotions=False):
+        """Yield the legal moves for a colour one at a time, as Moves.
+
+        See iter_codes. As with get_legal_moves, castle moves and en passant
+        moves are not included.
+
+        """
+
+        for code in self.iter_codes(piece_colour, promotions):
+            yield Move.Move.from_code(code)
+
+    def iter_code_stages(self, piece_colour, promotions=False):
+        """Yield the legal move codes for a colour as three lists: captures,
+        then promotions which do not capture, then all other moves.
+
+        Captures are ordered most valuable victim first and, for equal
+        victims, least valuable attacker first (see MVV_LVA_VALUES). Each
+        list is only built when it is asked for. The captures stage only
+        looks at the squares of enemy pieces, so a search which gets a
+        cutoff from a capture never works out pawn pushes or tests whether
+        the king may move to empty squares. Checks, pins and the attacks
+        of sliding pieces are worked out once and shared between the
+        stages. Together the lists hold the same moves as get_legal_codes.
+
+        Args:
+            - piece_colour:  a member of the Piece.PieceColour enum
+            - promotions:  as for get_legal_codes
+
+        """
+
+        squares = self.squares
+        enemies = self.piece_bb[-piece_colour][p_type.blank]
+        back_ranks = RANK_8 | RANK_1
+
+        pawns = self.piece_bb[piece_colour][p_type.pawn]
+        # Pawns one step from promoting
+        if piece_colour == Colour.white:
+            promoting = pawns & (RANK_8 << 8)
+        else:
+            promoting = pawns & (RANK_1 >> 8)
+
+        check_and_pins = self.get_check_and_pins(piece_colour)
+
+        if check_and_pins[0] == FULL:
+            attacks = {}
+
+            def stage_targets(mask, promotions, piece_types=MOVING_TYPES):
+                return self._iter_targets(piece_colour, promotions, mask,
+                                          check_and_pins, attacks,
+                                          piece_types)
+        else:
+            # In check there are few moves, so they are all found at once
+            # and shared out between the stages
+            pieces = list(self._iter_targets(piece_colour, promotions,
+                                             FULL, check_and_pins))
+
+            def stage_targets(mask, promotions, piece_types=MOVING_TYPES):
+                return ((start, targets & mask, promotion_types)
+                        for start, targets, promotion_types in pieces
+                        if targets & mask
+                        and squares[start].type in piece_types)
+
+        captures = []
+        for start, targets, promotion_types in stage_targets(enemies,
+                                                             promotions):
+            self._append_codes(captures, start, targets, enemies,
+                               promotion_types)
+
+        captures.sort(key=lambda code:
+                      16*MVV_LVA_VALUES[squares[code >> Move.TO_SHIFT & 63]
+                                        .type]
+                      - MVV_LVA_VALUES[squares[code & 63].type],
+                      reverse=True)
+        yield captures
+
+        pushes = []
+        if promoting:
+            for start, targets, promotion_types in stage_targets(
+                    back_ranks & ~enemies, promotions, (p_type.pawn,)):
+                self._append_codes(pushes, start, targets, enemies,
+                                   promotion_types)
+        yield pushes
+
+        quiets = []
+        for start, targets, promotion_types in stage_targets(~enemies & FULL,
+                                                             False):
+            if (1 << start) & pawns:
+                targets &= ~back_ranks
+            if targets:
+                self._append_codes(quiets, start, targets, enemies)
+        yield quiets
+
+    def _iter_targets(self, piece_colour, promotions, mask=FULL,
+                      check_and_pins=None, attacks=None,
+                      piece_types=MOVING_TYPES):
+        """Yield (start, targets, promotion_types) for each piece of a colour
+        which has a legal move, where targets is the bitboard of squares it
+        may legally move to. The king comes first.
+
+        Args:
+            - piece_colour, promotions:  as for get_legal_codes
+            - mask:  a bitboard of the only target squares wanted. Other
+                     squares are not looked at, so eg. the king's safety
+                     is only tested on these squares.
+            - check_and_pins:  the result of get_check_and_pins, if it has
+                               already been worked out
+            - attacks:  a dict of the squares attacked by each knight or
+                        sliding piece, keyed by its square, which is filled
+                        in and reused across calls on the same position
+            - piece_types:  the PieceTypes of the pieces wanted
+
+        """
+
+        check_mask, pins = (check_and_pins if check_and_pins is not None
+                            else self.get_check_and_pins(piece_colour))
+        bitboards = self.piece_bb[piece_colour]
+        own = bitboards[p_type.blank]
+        enemies = self.piece_bb[-piece_colour][p_type.blank]
+        occupied = own | enemies
+
+        king_sq = self.king_squares[piece_colour]
+
+        if king_sq is not None and p_type.king in piece_types:
+            targets = KING_ATTACKS[king_sq] & ~own & mask
+            king_targets = 0
+
+            while targets:
+                lsb = targets & -targets
+                targets ^= lsb
+                sq = lsb.bit_length() - 1
+
+                if self._is_safe(king_sq, sq, sq, piece_colour, occupied,
+                                 lsb):
+                    king_targets |= lsb
+
+            if king_targets:
+                yield king_sq, king_targets, (0,)
+
+        # In double check only the king may move
+        if not check_mask:
+            return
+
+        squares = self.squares
+
+        if check_mask != FULL:
+            for start, targets, promotion_types in (
+                    self._iter_evasion_targets(piece_colour, promotions,
+                                               check_mask, pins, occupied)):
+                if targets & mask and squares[start].type in piece_types:
+                    yield start, targets & mask, promotion_types
+            return
+
+        if attacks is None:
+            attacks = {}
+
+        # Pawn pushes need only be worked out if an empty square is wanted
+        pawn_pushes = mask & ~occupied
+
+        for piece_type in piece_types:
+            if piece_type == p_type.king:
+                continue
+
+            pieces = bitboards[piece_type]
+
+            while pieces:
+                lsb = pieces & -pieces
+                pieces ^= lsb
+                start = lsb.bit_length() - 1
+
+                if piece_type != p_type.pawn:
+                    piece_attacks = attacks.get(start)
+                    if piece_attacks is None:
+                        piece_attacks = self._get_targets(
+                            start, piece_type, piece_colour, occupied)
+                        attacks[start] = piece_attacks
+                elif pawn_pushes:
+                    piece_attacks = self._get_targets(
+                        start, piece_type, piece_colour, occupied)
+                else:
+                    piece_attacks = PAWN_ATTACKS[piece_colour][start] & enemies
+
+                targets = (piece_attacks & ~own & mask
+                           & pins.get(start, FULL))
+
+                if not targets:
+                    continue
+
+                if (piece_type == p_type.pawn and promotions
+                        and targets & (RANK_8 | RANK_1)):
+                    yield start, targets, PROMOTION_TYPES
+                else:
+                    yield start, targets, (0,)
+
+    def _iter_evasion_targets(self, piece_colour, promotions, check_mask,
+                              pins, occupied):
+        """Yield (start, targets, promotion_types) as _iter_targets does for
+        the pieces other than the king, when the king is in check from one
+        piece.
+
+        The only moves which answer the check are captures of the checking
+        piece and moves onto the squares between it and the king, which
+        are the squares of check_mask. So rather than generating every
+        piece's moves, the pieces which can reach each of those (at most
+        seven) squares are found by looking outwards from the square.
+
+        """
+
+        bitboards = self.piece_bb[piece_colour]
+        enemies = self.piece_bb[-piece_colour][p_type.blank]
+        knights = bitboards[p_type.knight]
+        diagonal = bitboards[p_type.bishop] | bitboards[p_type.queen]
+        straight = bitboards[p_type.rook] | bitboards[p_type.queen]
+        pawns = bitboards[p_type.pawn]
+
+        if piece_colour == Colour.white:
+            behind, double_rank = 8, 4
+        else:
+            behind, double_rank = -8, 3
+
+        movers = {}
+        squares = check_mask
+
+        while squares:
+            lsb = squares & -squares
+            squares ^= lsb
+            sq = lsb.bit_length() - 1
+
+            starts = KNIGHT_ATTACKS[sq] & knights
+            if diagonal:
+                starts |= bishop_attacks(sq, occupied) & diagonal
+            if straight:
+                starts |= rook_attacks(sq, occupied) & straight
+
+            if lsb & enemies:
+                # Only the checking piece: pawns may capture it
+                starts |= PAWN_ATTACKS[-piece_colour][sq] & pawns
+            else:
+                # An empty square between: pawns may push onto it
+                start = sq + behind
+                if 0 <= start < 64:
+                    if (1 << start) & pawns:
+                        starts |= 1 << start
+                    elif (sq >> 3 == double_rank
+                            and not (1 << start) & occupied
+                            and (1 << (start + behind)) & pawns):
+                        starts |= 1 << (start + behind)
+
+            while starts:
+                start_bit = starts & -starts
+                starts ^= start_bit
+                start = start_bit.bit_length() - 1
+                movers[start] = movers.get(start, 0) | lsb
+
+        for start, targets in movers.items():
+            targets &= pins.get(start, FULL)
+
+            if not targets:
+                continue
+
+            if (promotions and (1 << start) & pawns
+                    and targets & (RANK_8 | RANK_1)):
+                yield start, targets, PROMOTION_TYPES
+            else:
+                yield start, targets, (0,)
+
+    def _append_codes(self, codes, start, targets, enemies,
+                      promotion_types=(0,)):
+        """Append codes for moves from start to each square of targets."""
+
+        for promotion in promotion_types:
+            base = start | promotion << Move.PROMOTION_SHIFT
+            squares = targets
+
+            while squares:
+                lsb = squares & -squares
+                squares ^= lsb
+                code = base | (lsb.bit_length() - 1) << Move.TO_SHIFT
+
+                if lsb & enemies:
+                    code |= Move.CAPTURE << Move.FLAGS_SHIFT
+
+                codes.append(code)
+
+    def _get_targets(self, sq, piece_type, piece_colour, occupied):
+        """Return the squares a piece other than a king could move to from
+        square sq, before pins, checks and friendly pieces are considered."""
+
+        if piece_type == p_type.knight:
+            return KNIGHT_ATTACKS[sq]
+        if piece_type == p_type.bishop:
+            return bishop_attacks(sq, occupied)
+        if piece_type == p_type.rook:
+            return rook_attacks(sq, occupied)
+        if piece_type == p_type.queen:
+            return bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)
+
+        # Pawns: white pawns move up the board (in the negative y direction)
+        # and may move two squares from the 2nd rank, and vice versa
+        enemies = self.piece_bb[-piece_colour][p_type.blank]
+        targets = PAWN_ATTACKS[piece_colour][sq] & enemies
+
+        if piece_colour == Colour.white:
+            forward = sq - 8
+            double = 48 <= sq < 56
+        else:
+            forward = sq + 8
+            double = 8 <= sq < 16
+
+        if 0 <= forward < 64 and not (occupied >> forward) & 1:
+            targets |= 1 << forward
+
+            double_forward = 2*forward - sq
+            if double and not (occupied >> double_forward) & 1:
+                targets |= 1 << double_forward
+
+        return targets
+
+    def get_check_and_pins(self, piece_colour):
+        """Return the check evasion mask and pinned pieces of a colour.
+
+        Args:
+            - piece_colour:  a member of the Piece.PieceColour enum
+
+        Returns: a tuple containing two pieces of information:
+            [0] A bitboard of the squares to which a piece other than the king
+                may move without leaving its king in check. This is every
+                square if the king is not in check, the checking piece and the
+                squares between it and the king if there is one checking
+                piece, and no squares if there are two.
+            [1] A dict mapping the square index (x + 8*y) of each pinned piece
+                to a bitboard of the squares it may move to without exposing
+                the king: those on the line between the king and the pinning
+                piece, including the pinning piece.
+
+        """
+
+        king_sq = self.king_squares[piece_colour]
+        pins = {}
+
+        if king_sq is None:
+            return (FULL, pins)
+
+        own = self.piece_bb[piece_colour][p_type.blank]
+        enemy = self.piece_bb[-piece_colour]
+        occupied = own | enemy[p_type.blank]
+
+        checkers = ((KNIGHT_ATTACKS[king_sq] & enemy[p_type.knight])
+                    | (PAWN_ATTACKS[piece_colour][king_sq]
+                       & enemy[p_type.pawn]))
+        check_mask = checkers
+
+        rooks = enemy[p_type.rook] | enemy[p_type.queen]
+        bishops = enemy[p_type.bishop] | enemy[p_type.queen]
+
+        for sliders, ray_tables in ((rooks, _ROOK_RAY_TABLES),
+                                    (bishops, _BISHOP_RAY_TABLES)):
+            for rays, towards_high in ray_tables:
+                ray = rays[king_sq]
+
+                if not ray & sliders:
+                    continue
+
+                blockers = ray & occupied
+
+                if towards_high:
+                    first = (blockers & -blockers).bit_length() - 1
+                else:
+                    first = blockers.bit_length() - 1
+
+                first_bit = 1 << first
+
+                if first_bit & sliders:
+                    checkers |= first_bit
+                    check_mask |= ray ^ rays[first]
+                elif first_bit & own:
+                    beyond = blockers ^ first_bit
+
+                    if not beyond:
+                        continue
+
+                    if towards_high:
+                        second = (beyond & -beyond).bit_length() - 1
+                    else:
+                        second = beyond.bit_length() - 1
+
+                    if (1 << second) & sliders:
+                        pins[first] = ray ^ rays[second]
+
+        if not checkers:
+            check_mask = FULL
+        elif checkers & (checkers - 1):
+            check_mask = 0
+
+        return (check_mask, pins)
+
+    def get_legal_mask(self, x, y):
+        """Return a bitboard of the squares the piece at (x, y) may move to
+        without leaving its king in check, as far as pins and checks allow.
+
+        The piece's own movement rules are not taken into account, and the
+        mask should not be used for king moves.
+
+        """
+
+        check_mask, pins = self.get_check_and_pins(
+            self.squares[x + 8*y].colour)
+
+        return check_mask & pins.get(x + 8*y, FULL)
+
+    def get_moves_to(self, x, y, targets):
+        """Return the valid moves from (x, y) to the squares of a bitboard.
+
+        Each move is tested individually with is_valid_move.
+
+        Args:
+            - x, y:  ints specifying the position of the piece to move
+            - targets:  a bitboard of the squares to move to. These should
+                        not contain pieces of the moving piece's colour.
+
+        """
+
+        move_list = []
+
+        while targets:
+            lsb = targets & -targets
+            targets ^= lsb
+            sq = lsb.bit_length() - 1
+
+            move = Move.Move((x, y), (sq & 7, sq >> 3))
+            if self.is_valid_move(move):
+                move_list.append(move)
+
+        return move_list
+
+    def make_moves_to(self, x, y, targets):
+        """Return moves from (x, y) to the squares of a bitboard.
+
+        Unlike get_moves_to, the moves are not tested: the targets should
+        already have been restricted with get_legal_mask or
+        get_check_and_pins.
+
+        """
+
+        codes = Move.new_code_list()
+        enemies = self.piece_bb[-self.squares[x + 8*y].colour][p_type.blank]
+        self._append_codes(codes, x + 8*y, targets, enemies)
+
+        return [Move.Move.from_code(code) for code in codes]
+
     def get_king_moves(self, x, y):
         """Return a list of available moves for a king at (x, y).
 
@@ -595,212 +1373,283 @@ class Board:
 
         """
 
-        move_list = []
-        square_list = [(x+1, y+1), (x+1, y),   (x+1, y-1), (x, y+1),
-                       (x, y-1),   (x-1, y+1), (x-1, y),   (x-1, y-1)]
+        own = self.piece_bb[self.squares[x + 8*y].colour][p_type.blank]
+        targets = KING_ATTACKS[x + 8*y] & ~own
 
-        for square in square_list:
-            move = Move.Move((x, y), square)
-            if self.is_possible_valid_move(move):
-                move_list.append(move)
+        return self.get_moves_to(x, y, targets)
 
-        return move_list
+    def _get_masked_moves(self, x, y, piece_type, legal_mask):
+        if legal_mask is None:
+            legal_mask = self.get_legal_mask(x, y)
+
+        colour = self.squares[x + 8*y].colour
+        targets = self._get_targets(x + 8*y, piece_type, colour,
+                                    self.get_occupied())
+        own = self.piece_bb[colour][p_type.blank]
 
-    def get_queen_moves(self, x, y):
+        return self.make_moves_to(x, y, targets & ~own & legal_mask)
+
+    def get_queen_moves(self, x, y, legal_mask=None):
         """Return a list of available moves for a queen at (x, y).
 
         Given a position (x, y) returns a list of moves which it is legal for
         a queen at (x, y) to make.
 
+        Args:
+            - legal_mask:  the result of get_legal_mask(x, y), which will be
+                           worked out if it is not passed
+
         """
 
-        move_list = []
-        move_list.extend(self.get_bishop_moves(x, y))
-        move_list.extend(self.get_rook_moves(x, y))
-        return move_list
+        return self._get_masked_moves(x, y, p_type.queen, legal_mask)
 
-    def get_bishop_moves(self, x, y):
+    def get_bishop_moves(self, x, y, legal_mask=None):
         """Return a list of available moves for a bishop at (x, y).
 
         Given a position (x, y) returns a list of moves which it is legal for
         a bishop at (x, y) to make.
 
-        """
+        Args:
+            - legal_mask:  the result of get_legal_mask(x, y), which will be
+                           worked out if it is not passed
 
-        move_list = []
-        directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+        """
 
-        for direction in directions:
-            direction_moves = self.search_direction(
-                x, y, direction[0], direction[1])
-            move_list.extend(direction_moves[2])
+        return self._get_masked_moves(x, y, p_type.bishop, legal_mask)
 
-        return move_list
-
-    def get_knight_moves(self, x, y):
+    def get_knight_moves(self, x, y, legal_mask=None):
         """Return a list of available moves for a knight at (x, y).
 
         Given a position (x, y) returns a list of moves which it is legal for
         a knight at (x, y) to make.
 
-        """
-
-        move_list = []
-        square_list = [(x+1, y+2), (x-1, y+2), (x+2, y+1), (x-2, y+1),
-                       (x+2, y-1), (x-2, y-1), (x+1, y-2), (x-1, y-2)]
+        Args:
+            - legal_mask:  the result of get_legal_mask(x, y), which will be
+                           worked out if it is not passed
 
-        for square in square_list:
-            move = Move.Move((x, y), square)
-            if self.is_possible_valid_move(move):
-                move_list.append(move)
+        """
 
-        return move_list
+        return self._get_masked_moves(x, y, p_type.knight, legal_mask)
 
-    def get_rook_moves(self, x, y):
+    def get_rook_moves(self, x, y, legal_mask=None):
         """Return a list of available moves for a rook at (x, y).
 
         Given a position (x, y) returns a list of moves which it is legal for
         a rook at (x, y) to make.
 
-        """
-
-        move_list = []
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+        Args:
+            - legal_mask:  the result of get_legal_mask(x, y), which will be
+                           worked out if it is not passed
 
-        for direction in directions:
-            direction_moves = self.search_direction(
-                x, y, direction[0], direction[1])
-            move_list.extend(direction_moves[2])
+        """
 
-        return move_list
+        return self._get_masked_moves(x, y, p_type.rook, legal_mask)
 
-    def get_pawn_moves(self, x, y):
+    def get_pawn_moves(self, x, y, legal_mask=None):
         """Return a list of available moves for a pawn at (x, y).
 
         Given a position (x, y) returns a list of moves which it is legal for
         a pawn at (x, y) to make, excluding en passant moves.
 
+        Args:
+            - legal_mask:  the result of get_legal_mask(x, y), which will be
+                           worked out if it is not passed
+
         """
 
-        move_list = []
-        can_double = False   # True if the pawn can move two squares forward.
-        pawn = self.piece_array[x][y]
+        return self._get_masked_moves(x, y, p_type.pawn, legal_mask)
+
+    ###########################################################################
+    ############################ BOARD EVALUATION #############################
+    ###########################################################################
+
+    def is_in_check(self, piece_colour):
+        """Return true if the king of the passed colour is in check.
 
-        if pawn.colour == Colour.white:
-            m = -1  # m is a multiplier which ensures white pieces move up the
-            # board (in the negative y direction) and vice versa
+        Note that if no king of the passed colour is found, this function will
+        return false.
 
-            if y == 6:
-                can_double = True
-        elif pawn.colour == Colour.black:
-            m = 1
+        Args:
+            piece_colour:  a member of the Piece.PieceColour enum
 
-            if y == 1:
-                can_double = True
+        """
 
-        one_forward = Move.Move((x, y), (x, y + 1*m))
-        two_forward = Move.Move((x, y), (x, y + 2*m))
-        left_take = Move.Move((x, y), (x - 1, y + 1*m))
-        right_take = Move.Move((x, y), (x + 1, y + 1*m))
+        king_sq = self.king_squares[piece_colour]
 
-        if (self.is_possible_valid_move(one_forward)
-                and not self.is_take_move(one_forward)):
-            move_list.append(one_forward)
+        if king_sq is None:
+            return False
 
-            if (self.is_possible_valid_move(two_forward)
-                    and can_double
-                    and not self.is_take_move(two_forward)):
-                move_list.append(two_forward)
+        return self.is_square_attacked(king_sq & 7, king_sq >> 3,
+                                       -piece_colour)
 
-        if (self.is_possible_valid_move(left_take)):
-            if (self.is_take_move(left_take)):
-                move_list.append(left_take)
+    def is_square_attacked(self, x, y, by_colour):
+        """Return true if any piece of the passed colour attacks a square.
 
-        if (self.is_possible_valid_move(right_take)):
-            if (self.is_take_move(right_take)):
-                move_list.append(right_take)
+        A square is attacked if a piece could capture on it, whether or not
+        the square is empty. Pawns attack diagonally only.
 
-        return move_list
+        Args:
+            - x, y:  ints specifying the position of the square
+            - by_colour:  a member of the Piece.PieceColour enum
 
-    ###########################################################################
-    ############################ BOARD EVALUATION #############################
-    ###########################################################################
+        """
 
-    def is_in_check(self, piece_colour):
-        """Return true if the king of the passed colour is in check.
+        return self._is_attacked(x + 8*y, by_colour, self.get_occupied())
 
-        Note that if no king of the passed colour is found, this function will
-        return false.
+    def attackers_of(self, x, y, by_colour=None):
+        """Return a list of the positions of the pieces attacking a square.
 
         Args:
-            piece_colour:  a member of the Piece.PieceColour enum
+            - x, y:  ints specifying the position of the square
+            - by_colour:  a member of the Piece.PieceColour enum, or None to
+                          include the attackers of both colours
 
         """
 
-        # Find King
-        for i, j in itertools.product(range(Board.SIZE), range(Board.SIZE)):
-            piece = self.piece_array[i][j]
-            if piece.type == p_type.king and piece.colour == piece_colour:
-                x = i
-                y = j
-                break
+        attackers = self.get_attackers(x + 8*y, self.get_occupied())
+
+        if by_colour is not None:
+            attackers &= self.piece_bb[by_colour][p_type.blank]
+
+        posns = []
+
+        while attackers:
+            lsb = attackers & -attackers
+            attackers ^= lsb
+            sq = lsb.bit_length() - 1
+            posns.append((sq & 7, sq >> 3))
+
+        return posns
+
+    def get_attackers(self, sq, occupied):
+        """Return a bitboard of the pieces of both colours attacking a square.
+
+        Sliding pieces are blocked by the squares of occupied rather than
+        by the board, so that a caller (eg. a static exchange evaluation)
+        can remove pieces and see the attackers behind them. Pieces which
+        are not in occupied are left out.
+
+        Args:
+            - sq:  the index (x + 8*y) of the square
+            - occupied:  a bitboard of the squares to treat as occupied
+
+        """
+
+        white = self.piece_bb[Colour.white]
+        black = self.piece_bb[Colour.black]
+
+        attackers = ((PAWN_ATTACKS[Colour.black][sq] & white[p_type.pawn])
+                     | (PAWN_ATTACKS[Colour.white][sq] & black[p_type.pawn])
+                     | (KNIGHT_ATTACKS[sq]
+                        & (white[p_type.knight] | black[p_type.knight]))
+                     | (KING_ATTACKS[sq]
+                        & (white[p_type.king] | black[p_type.king])))
+
+        rooks = (white[p_type.rook] | white[p_type.queen]
+                 | black[p_type.rook] | black[p_type.queen])
+        bishops = (white[p_type.bishop] | white[p_type.queen]
+                   | black[p_type.bishop] | black[p_type.queen])
+
+        if rooks:
+            attackers |= rook_attacks(sq, occupied) & rooks
+        if bishops:
+            attackers |= bishop_attacks(sq, occupied) & bishops
+
+        return attackers & occupied
+
+    def see(self, code):
+        """Return the material won by a capture, in centipawns, if both
+        sides go on capturing on its end square for as long as it pays.
+
+        This is static exchange evaluation: each side captures with its
+        least valuable piece, and may stop capturing whenever that is
+        better for it. Pieces behind an attacker on the same line join in
+        once it has moved. Pins and checks are ignored, and promotions are
+        not counted.
+
+        Args:
+            - code:  the move code (see Move.encode) of a capture, or of any
+                     other move to see whether its end square is safe
+
+        """
+
+        start = code & 63
+        end = code >> Move.TO_SHIFT & 63
+
+        occupied = (self.piece_bb[Colour.white][p_type.blank]
+                    | self.piece_bb[Colour.black][p_type.blank])
+
+        if code >> Move.FLAGS_SHIFT & Move.EN_PASSANT:
+            gains = [SEE_VALUES[p_type.pawn]]
+            occupied ^= 1 << ((end & 7) + (start & 56))
         else:
-            return False
+            gains = [SEE_VALUES[self.squares[end].type]]
 
-        # Radiate outwards and check for enemy rooks, bishops and queens:
+        piece_type = self.squares[start].type
+        side = -self.squares[start].colour
+        from_bb = 1 << start
 
-        # Look for pawns
-        
-        square_list = [(x+1, y-piece_colour), (x-1, y-piece_colour)]
+        while from_bb:
+            # The gain if the piece just moved to end is taken in turn
+            gains.append(SEE_VALUES[piece_type] - gains[-1])
 
-        for square in square_list:
-            piece = self.get_piece(*square)
-            if piece is not None:
-                if piece.type == p_type.pawn:
-                    if piece.colour != piece_colour:
-                        return True
-
-        # Look for knights
-        square_list = [(x+1, y+2), (x-1, y+2), (x+2, y+1), (x-2, y+1),
-                       (x+2, y-1), (x-2, y-1), (x+1, y-2), (x-1, y-2)]
-
-        for square in square_list:
-            piece = self.get_piece(*square)
-            if piece is not None:
-                if piece.type == p_type.knight:
-                    if piece.colour != piece_colour:
-                        return True
-
-        # The enemy king
-        square_list = [(x+1, y+1), (x+1, y),   (x+1, y-1), (x, y+1),
-                       (x, y-1),   (x-1, y+1), (x-1, y),   (x-1, y-1)]
-
-        for square in square_list:
-            piece = self.get_piece(*square)
-            if piece is not None:
-                if piece.type == p_type.king:
-                    if piece.colour != piece_colour:
-                        return True
+            # Neither side can do better by going on
+            if max(-gains[-2], gains[-1]) < 0:
+                break
+
+            occupied ^= from_bb
+            attackers = (self.get_attackers(end, occupied)
+                         & self.piece_bb[side][p_type.blank])
 
-        # Vertically/Horizontally
-        for dirn in self.ver_hor_list:
-            piece = self.search_direction(
-                x, y, dirn[0], dirn[1], no_legal=True)[1]
+            from_bb = 0
+            for piece_type in SEE_ORDER:
+                pieces = attackers & self.piece_bb[side][piece_type]
+                if pieces:
+                    from_bb = pieces & -pieces
+                    break
 
-            if piece is not None:
-                if piece.type in (p_type.rook, p_type.queen):
-                    if piece.colour != piece_colour:
-                        return True
+            side = -side
 
-        # And Finally, Diagonally
-        for dirn in self.diag_list:
-            piece = self.search_direction(
-                x, y, dirn[0], dirn[1], no_legal=True)[1]
+        # Work back from the end of the exchange, letting each side stop
+        # capturing if that is better for it. The last gain is that of a
+        # capture which could not be made.
+        gains.pop()
+        while len(gains) > 1:
+            last = gains.pop()
+            gains[-1] = -max(-gains[-1], last)
 
-            if piece is not None:
-                if piece.type in (p_type.bishop, p_type.queen):
-                    if piece.colour != piece_colour:
-                        return True
+        return gains[0]
+
+    def _is_attacked(self, sq, by_colour, occupied, captured=0):
+        """Return true if a piece of by_colour attacks square sq.
+
+        Args:
+            - sq:  the index (x + 8*y) of the square to look at
+            - by_colour:  the colour of the attacking pieces
+            - occupied:  a bitboard of the occupied squares, used to block
+                         sliding pieces
+            - captured:  a bitboard of squares whose pieces should be
+                         ignored (because they have just been taken)
+
+        """
+
+        enemy = self.piece_bb[by_colour]
+        alive = ~captured
+
+        if PAWN_ATTACKS[-by_colour][sq] & enemy[p_type.pawn] & alive:
+            return True
+        if KNIGHT_ATTACKS[sq] & enemy[p_type.knight] & alive:
+            return True
+        if KING_ATTACKS[sq] & enemy[p_type.king]:
+            return True
+
+        rooks = (enemy[p_type.rook] | enemy[p_type.queen]) & alive
+        bishops = (enemy[p_type.bishop] | enemy[p_type.queen]) & alive
+
+        if rooks and rook_attacks(sq, occupied) & rooks:
+            return True
+        if bishops and bishop_attacks(sq, occupied) & bishops:
+            return True
 
         return False
 
@@ -812,12 +1661,9 @@ class Board:
 
         """
 
-        if piece_colour == colour.white:
-            enemy = Colour.black
-        else:
-            enemy = Colour.white
+        enemy = -piece_colour
 
-        return (not legal_move_exists(enemy)) and self.is_in_check(enemy)
+        return (not self.legal_move_exists(enemy)) and self.is_in_check(enemy)
 
     def legal_move_exists(self, piece_colour):
         """Return true if the team of the passed colour can make a legal move.
@@ -827,47 +1673,71 @@ class Board:
 
         """
 
-        for i, j in itertools.product(range(Board.SIZE), range(Board.SIZE)):
-            piece = self.get_piece(i, j)
-            if piece.colour == piece_colour:
-                if len(self.get_piece_moves(i, j)) > 0:
-                    return True
+        for code in self.iter_codes(piece_colour):
+            return True
 
         return False
 
     def is_king_draw(self):
         """Return true if the Kings are the only pieces left on the board."""
-        for i, j in itertools.product(range(Board.SIZE), range(Board.SIZE)):
-            piece = self.piece_array[i][j]
-            if not piece.type in (p_type.king, p_type.blank):
+        white = self.piece_counts[Colour.white]
+        black = self.piece_counts[Colour.black]
+
+        return (white[p_type.blank] == white[p_type.king]
+                and black[p_type.blank] == black[p_type.king])
+
+    def is_insufficient_material(self):
+        """Return true if neither side has the material to checkmate.
+
+        This is the case for king against king, king and bishop or king and
+        knight against king, and when the only pieces besides the kings are
+        bishops which all stand on squares of the same colour.
+
+        """
+
+        white = self.piece_counts[Colour.white]
+        black = self.piece_counts[Colour.black]
+
+        for counts in (white, black):
+            if (counts[p_type.pawn] or counts[p_type.rook]
+                    or counts[p_type.queen]):
                 return False
 
-        return True
+        minors = (white[p_type.blank] - white[p_type.king]
+                  + black[p_type.blank] - black[p_type.king])
+
+        if minors <= 1:
+            return True
+
+        if white[p_type.knight] or black[p_type.knight]:
+            return False
+
+        bishops = (self.piece_bb[Colour.white][p_type.bishop]
+                   | self.piece_bb[Colour.black][p_type.bishop])
+
+        return not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES
 
     def can_promote_pawn(self, piece_colour):
         """Return true if the player of passed colour can promote a pawn."""
 
         if (piece_colour == Colour.white):
-            y = 0
+            back_rank = RANK_8
         else:
-            y = 7
+            back_rank = RANK_1
 
-        for i in range(Board.SIZE):
-            # if self.get_piece(i, y) == Piece.Pawn(piece_colour):
-            if self.piece_array[i][y].type == p_type.pawn:
-                return True
-
-        return False
+        return (self.piece_bb[piece_colour][p_type.pawn] & back_rank) != 0
 
     ###########################################################################
     ########################### BOARD REPRESENTATION ##########################
     ###########################################################################
 
-    def get_san(self, move):
+    def get_san(self, move, pins=None):
         """Return a SAN representation of move (ignoring checks/promotions).
 
            Args:
                -move: the move to return SAN of
+               -pins: the pins of the moving side, as returned by
+                      get_check_and_pins, if they are already known
         """
         san = ""
 
@@ -876,18 +1746,18 @@ class Board:
             san += "O-O"
 
             # Check if queenside
-            if(move.end_posn == (0, 0) or move.end_posn == (0, 7)):
+            if(move.end_posn[0] < move.start_posn[0]):
 
                 san += "-O"
 
         else:
-            piece = self.piece_array[move.start_posn[0]][move.start_posn[1]]
+            piece = self.squares[move.start_posn[0] + 8*move.start_posn[1]]
 
             if(piece.type != p_type.pawn):
                 san += piece.get_san().upper()
-                san += self.get_clar_str(move, piece)
+                san += self.get_clar_str(move, piece, pins)
 
-            if self.is_take_move(move):
+            if move.en_passant or self.is_take_move(move):
 
                 if piece.type == p_type.pawn:
                     # If pawn we only give the file (no clarification needed)
@@ -900,48 +1770,93 @@ class Board:
 
         return san
 
-    def get_clar_str(self, move, piece):
+    def get_san_list(self, moves):
+        """Return a list of the SAN of each move in a list of moves.
+
+           The moves should all be for the same side, in the current
+           position, eg. a list from get_legal_moves. Pins are worked out
+           once for the whole list, rather than for each ambiguous move.
+
+           Args:
+               -moves: the moves to return SAN of
+        """
+
+        pins = None
+        sans = []
+
+        for move in moves:
+            if pins is None and not move.castle:
+                piece = self.squares[move.start_posn[0]
+                                     + 8*move.start_posn[1]]
+                pins = self.get_check_and_pins(piece.colour)[1]
+
+            sans.append(self.get_san(move, pins))
+
+        return sans
+
+    def get_clar_str(self, move, piece, pins=None):
         """Create a clarification string for SAN if required.
 
            Used to dissambiguate piece moves where more than one piece of a 
-           a given type can reach the target square
+           a given type can reach the target square. The other pieces are
+           found by looking back from the target square, and are only
+           checked for pins if there are any.
 
            Args:
                - move: the move that has been made
                - piece: the piece being moved
+               - pins: the pins of the moving side, as returned by
+                       get_check_and_pins, if they are already known
         """
 
-        clar_str = ""
-        need_file = False
-        need_rank = False
-
-        for i in range(Board.SIZE):
-            for j in range(Board.SIZE):
-
-                if not (i == move.start_posn[0] and j == move.start_posn[1]):
+        start_x, start_y = move.start_posn
+        end = move.end_posn[0] + 8*move.end_posn[1]
+        same_type = self.piece_bb[piece.colour][piece.type]
+        occupied = self.get_occupied()
+
+        if piece.type == p_type.knight:
+            rivals = KNIGHT_ATTACKS[end] & same_type
+        elif piece.type == p_type.bishop:
+            rivals = bishop_attacks(end, occupied) & same_type
+        elif piece.type == p_type.rook:
+            rivals = rook_attacks(end, occupied) & same_type
+        elif piece.type == p_type.queen:
+            rivals = ((bishop_attacks(end, occupied)
+                       | rook_attacks(end, occupied)) & same_type)
+        else:
+            return ""
 
-                    if self.piece_array[i][j].colour == piece.colour:
+        rivals &= ~(1 << (start_x + 8*start_y))
 
-                        if(self.piece_array[i][j].type == piece.type):
+        if not rivals:
+            return ""
 
-                            moves_list = self.get_piece_moves(i, j)
+        if pins is None:
+            pins = self.get_check_and_pins(piece.colour)[1]
 
-                            for m in moves_list:
+        # Pieces which could reach the square but are pinned away from it
+        # can not make the move, so do not need telling apart
+        posns = []
 
-                                if(m.end_posn == move.end_posn):
+        while rivals:
+            lsb = rivals & -rivals
+            rivals ^= lsb
+            sq = lsb.bit_length() - 1
 
-                                    if(i == move.start_posn[0]):
-                                        need_rank = True
+            if pins.get(sq, FULL) >> end & 1:
+                posns.append((sq & 7, sq >> 3))
 
-                                    else:
-                                        need_file = True
+        if not posns:
+            return ""
 
-        if(need_file):
-            clar_str += Board.FILE_LABELS[move.start_posn[0]]
-        if(need_rank):
-            clar_str += str(8-move.start_posn[1])
+        # The file is given if it tells the pieces apart, else the rank if
+        # that does, else both
+        if all(x != start_x for x, y in posns):
+            return Board.FILE_LABELS[start_x]
+        if all(y != start_y for x, y in posns):
+            return str(8-start_y)
 
-        return clar_str
+        return Board.FILE_LABELS[start_x] + str(8-start_y)
 
     def get_pictorial(self):
         """Return a pictorial string representation of the board."""
@@ -963,34 +1878,149 @@ class Board:
     def get_forsyth(self):
         """Return a string representation of the board in FEN.
 
-        The string will have one space at the end.
+        This is only the piece placement, the first field of a full FEN
+        string (see Gamestate.get_fen). The string will have one space at
+        the end.
 
         """
 
-        forsyth = ""
-
-        for row in range(Board.SIZE):
-            column = 0
+        squares = self.squares
+        ranks = []
 
-            while column < BOARD_SIZE:
-                piece = self.piece_array[column][row]
+        for row in range(0, 64, 8):
+            rank = ""
+            gap = 0
 
+            for piece in squares[row:row + 8]:
                 if piece.type == p_type.blank:
-                    gap = self.search_direction(
-                        column, row, 0, 1, no_legal=True)[0]
-                    forsyth += str(gap + 1)
-                    column += gap + 1
+                    gap += 1
+                else:
+                    if gap:
+                        rank += str(gap)
+                        gap = 0
+                    rank += piece.get_san()
+
+            if gap:
+                rank += str(gap)
+            ranks.append(rank)
+
+        return "/".join(ranks) + " "
+
+    def set_forsyth(self, placement):
+        """Set up the board from the piece placement field of a FEN string.
+
+        Any pieces already on the board are removed. Rather than calling
+        place_piece for each piece, the squares, bitboards and hash are
+        built in one pass, so that many positions can be loaded quickly.
+
+        Args:
+            - placement:  eg. "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"
+
+        Raises:
+            - ValueError if placement is not a valid piece placement
+
+        """
+
+        ranks = placement.split("/")
+        if len(ranks) != Board.SIZE:
+            raise ValueError("FEN placement needs 8 ranks: " + placement)
+
+        squares = []
+
+        for rank in ranks:
+            start = len(squares)
+
+            for char in rank:
+                if char in "12345678":
+                    squares.extend([Piece.BLANK] * int(char))
+                elif char in FEN_PIECES:
+                    squares.append(FEN_PIECES[char])
                 else:
-                    forsyth += piece.get_san()
-                    gap = searchDirection(
-                        column, row, 0, 1, no_legal=True)[0]
+                    raise ValueError("Bad FEN piece '" + char + "'")
+
+            if len(squares) - start != Board.SIZE:
+                raise ValueError("FEN rank is not 8 squares: " + rank)
+
+        self.set_squares(squares)
+
+    def set_squares(self, squares):
+        """Set up the board from a list of the piece on each square.
+
+        Like set_forsyth, the squares, bitboards and hash are built in one
+        pass rather than by calling place_piece for each piece.
+
+        Args:
+            - squares:  a list of 64 shared pieces (see Piece.make_piece),
+                        with Piece.BLANK for an empty square, indexed by
+                        x + 8*y. The board keeps the list.
+
+        """
+
+        piece_bb = [None, [0]*7, [0]*7]
+        piece_counts = [None, [0]*7, [0]*7]
+        king_squares = [None, None, None]
+        zobrist = 0
+        score = 0
+        keys = Zobrist.PIECE_KEYS
+        scores = Evaluation.SQUARE_SCORES
+
+        for sq, piece in enumerate(squares):
+            if piece.type != p_type.blank:
+                bitboards = piece_bb[piece.colour]
+                bitboards[piece.type] |= 1 << sq
+                bitboards[p_type.blank] |= 1 << sq
+                zobrist ^= keys[piece.colour][piece.type][sq]
+                score += scores[piece.colour][piece.type][sq]
+
+                counts = piece_counts[piece.colour]
+                counts[piece.type] += 1
+                counts[p_type.blank] += 1
+
+                if piece.type == p_type.king:
+                    king_squares[piece.colour] = sq
+
+        self.squares = squares
+        self.piece_bb = piece_bb
+        self.piece_counts = piece_counts
+        self.king_squares = king_squares
+        self.zobrist = zobrist
+        self.score = score
+        self.piece_array = _PieceArray(squares)
+
+
+class _PieceArray:
+
+    """Read-only view of a board's squares list, indexed [x][y]."""
+
+    def __init__(self, squares):
+        self._files = tuple(_File(squares, x) for x in range(Board.SIZE))
+
+    def __getitem__(self, x):
+        return self._files[x]
+
+    def __len__(self):
+        return Board.SIZE
+
+    def __iter__(self):
+        return iter(self._files)
+
+
+class _File:
+
+    """Read-only view of one file (column) of a board's squares list."""
+
+    def __init__(self, squares, x):
+        self._squares = squares
+        self._x = x
+
+    def __getitem__(self, y):
+        if not 0 <= y < Board.SIZE:
+            raise IndexError("No square at " + str((self._x, y)))
 
-                    if gap > 0:
-                        forsyth += str(gap)
-                    column += gap + 1
+        return self._squares[self._x + 8*y]
 
-            if row < BOARD_SIZE - 1:
-                forsyth += "/"
+    def __len__(self):
+        return Board.SIZE
 
-        forsyth += " "
-        return forsyth
+    def __iter__(self):
+        return (self[y] for y in range(Board.SIZE))
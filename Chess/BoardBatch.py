@@ -0,0 +1,268 @@
+"""Contains the BoardBatch class, for evaluating many positions at once
+
+This module needs NumPy. Nothing else in the package imports it, so the
+rest of the game runs without NumPy installed.
+
+"""
+
+import numpy as np
+import Board
+import Evaluation
+import Piece
+from Piece import PieceType as p_type
+from Piece import PieceColour as Colour
+
+# Centipawns for each square a knight, bishop, rook or queen can move to
+MOBILITY_WEIGHT = 4
+
+# A square holds colour * type, so codes run from -6 to 6. Tables indexed
+# by code are offset by 6 to make the indices positive.
+_OFFSET = 6
+
+# FEN letter (as a byte) -> code, with "." standing for an empty square
+_FEN_CODES = np.zeros(256, dtype=np.int8)
+_FEN_LETTERS = np.zeros(256, dtype=bool)
+_FEN_LETTERS[ord(".")] = True
+for _letter, _piece in Board.FEN_PIECES.items():
+    _FEN_CODES[ord(_letter)] = _piece.colour * _piece.type
+    _FEN_LETTERS[ord(_letter)] = True
+
+# Shared piece for each code, indexed by code + _OFFSET
+_CODE_PIECES = [Piece.make_piece(abs(code), Colour.white if code > 0
+                                 else Colour.black) if code else Piece.BLANK
+                for code in range(-_OFFSET, _OFFSET + 1)]
+
+_EXPAND_DIGITS = str.maketrans({str(n): "." * n for n in range(1, 9)})
+_RANK_BREAKS = "/"*7
+
+# Bitboards (as in Board) of the squares which a piece moving dx files to
+# the right can land on without wrapping round the edge of the board
+_LANDING_MASKS = {dx: np.uint64(sum(1 << sq for sq in range(64)
+                                    if 0 <= (sq & 7) - dx < 8))
+                  for dx in range(-2, 3)}
+
+# Number of set bits in each byte
+_BYTE_COUNTS = np.array([bin(byte).count("1") for byte in range(256)],
+                        dtype=np.uint8)
+
+
+def _bitboards(present):
+    """Return an array of N bitboards (as in Board) from an N x 64 array
+    of booleans."""
+
+    packed = np.packbits(present, axis=1, bitorder="little")
+    return np.ascontiguousarray(packed).view("<u8").ravel()
+
+
+def _shift(bitboards, amount):
+    """Return bitboards with every bit moved up amount squares (down if
+    amount is negative), dropping those which leave the board. Bits may
+    wrap from one edge of the board to the other; see _LANDING_MASKS."""
+
+    if amount > 0:
+        return bitboards << np.uint64(amount)
+
+    return bitboards >> np.uint64(-amount)
+
+
+def _count_bits(bitboards):
+    """Return the number of squares in each of an array of bitboards."""
+
+    counts = _BYTE_COUNTS[bitboards.view(np.uint8)]
+    return counts.reshape(-1, 8).sum(axis=1, dtype=np.int32)
+
+
+def _slide(sliders, empty, dx, dy):
+    """Return the squares that the pieces of sliders attack in direction
+    (dx, dy), stopping at the first occupied square (Kogge-Stone fill)."""
+
+    step = dx + 8*dy
+    landing = _LANDING_MASKS[dx]
+
+    # Squares a ray may pass over, without wrapping round the board
+    travel = empty & landing
+    sliders = sliders | (travel & _shift(sliders, step))
+    travel = travel & _shift(travel, step)
+    sliders = sliders | (travel & _shift(sliders, 2*step))
+    travel = travel & _shift(travel, 2*step)
+    sliders = sliders | (travel & _shift(sliders, 4*step))
+
+    return _shift(sliders, step) & landing
+
+
+class BoardBatch:
+
+    """Holds the piece placement of many positions in one NumPy array.
+
+    Only the pieces are held: the side to move, castling rights and so on
+    are left to Gamestate. Every evaluation works on all of the positions
+    at once and returns an array with one score per position, in
+    centipawns from white's point of view.
+
+    Attributes:
+        - squares:  an N x 64 int8 array. squares[n][x + 8*y] is the colour
+                    times the type of the piece on (x, y) in position n (eg.
+                    -PieceType.rook for a black rook), or 0 if the square is
+                    empty.
+
+    """
+
+    def __init__(self, squares):
+        """Create a batch from an N x 64 array-like of piece codes.
+
+        Raises:
+            - ValueError if squares is not N x 64
+
+        """
+
+        self.squares = np.asarray(squares, dtype=np.int8)
+
+        if self.squares.ndim != 2 or self.squares.shape[1] != 64:
+            raise ValueError("squares must be N x 64, not "
+                             + str(self.squares.shape))
+
+    def __len__(self):
+        return len(self.squares)
+
+    @staticmethod
+    def from_boards(boards):
+        """Return a BoardBatch holding the positions of a list of Boards."""
+
+        codes = np.empty((len(boards), 64), dtype=np.int8)
+
+        for n, board in enumerate(boards):
+            codes[n] = [piece.colour * piece.type for piece in board.squares]
+
+        return BoardBatch(codes)
+
+    @staticmethod
+    def from_fens(fens):
+        """Return a BoardBatch holding the positions of a list of FEN strings.
+
+        Only the piece placement of each string is used. The strings are
+        joined and converted with a single table lookup, so this is much
+        faster than making a Board for each.
+
+        Raises:
+            - ValueError if a placement does not have 8 ranks of 8 squares,
+              naming the index of its FEN in fens
+
+        """
+
+        expanded = [fen.strip().partition(" ")[0].translate(_EXPAND_DIGITS)
+                    for fen in fens]
+
+        # 8 ranks of 8 squares expand to 71 characters, with the 7 slashes
+        # every ninth character and nowhere else
+        for index, placement in enumerate(expanded):
+            if (len(placement) != 71 or placement[8::9] != _RANK_BREAKS
+                    or placement.count("/") != 7):
+                raise ValueError("FEN " + str(index)
+                                 + " is not 8 ranks of 8 squares: "
+                                 + fens[index])
+
+        placements = "".join(expanded).replace("/", "")
+
+        try:
+            letters = np.frombuffer(placements.encode("ascii"),
+                                    dtype=np.uint8)
+        except UnicodeEncodeError:
+            raise ValueError("Bad letter in FEN placement")
+
+        if not _FEN_LETTERS[letters].all():
+            raise ValueError("Bad letter in FEN placement")
+
+        return BoardBatch(_FEN_CODES[letters].reshape(len(fens), 64))
+
+    def to_boards(self):
+        """Return a list of new Boards, one for each position."""
+
+        boards = []
+
+        for row in (self.squares + _OFFSET).tolist():
+            board = Board.Board()
+            board.set_squares([_CODE_PIECES[index] for index in row])
+            boards.append(board)
+
+        return boards
+
+    def material(self, values=Evaluation.PIECE_VALUES):
+        """Return the material balance of each position.
+
+        Args:
+            - values:  the value of each piece, indexed by PieceType
+
+        """
+
+        table = np.array([-value for value in reversed(values[1:])]
+                         + list(values), dtype=np.int32)
+
+        return table[self.squares + _OFFSET].sum(axis=1)
+
+    def piece_square(self, tables=Evaluation.PIECE_SQUARE_TABLES):
+        """Return the piece-square score of each position.
+
+        Args:
+            - tables:  a table of 64 scores for each PieceType, for the
+                       white pieces (see Evaluation.PIECE_SQUARE_TABLES)
+
+        """
+
+        white = np.array(tables, dtype=np.int32)
+        # Flip each table top to bottom and negate it for black
+        black = -white.reshape(7, 8, 8)[:, ::-1, :].reshape(7, 64)
+
+        # lookup[code + 6][sq] is the score of that piece on square sq
+        lookup = np.concatenate((black[:0:-1], white))
+
+        return lookup[self.squares + _OFFSET, np.arange(64)].sum(axis=1)
+
+    def mobility(self):
+        """Return the difference in mobility between white and black in
+        each position, as a number of moves.
+
+        This is a cheap stand-in for counting legal moves: it counts the
+        squares each knight, bishop, rook and queen could move to if there
+        were no pins or checks. Pawns and kings are left out.
+
+        """
+
+        squares = self.squares
+        empty = _bitboards(squares == 0)
+        total = np.zeros(len(squares), dtype=np.int32)
+
+        for sign in (Colour.white, Colour.black):
+            own = _bitboards(np.sign(squares) == sign)
+
+            queens = squares == sign*p_type.queen
+            knights = _bitboards(squares == sign*p_type.knight)
+            straight = _bitboards(queens | (squares == sign*p_type.rook))
+            diagonal = _bitboards(queens | (squares == sign*p_type.bishop))
+
+            moves = np.zeros(len(squares), dtype=np.int32)
+
+            # Each shift moves every knight to a different square, so no
+            # move is counted twice
+            for dx, dy in Board.KNIGHT_OFFSETS:
+                moves += _count_bits(_shift(knights, dx + 8*dy)
+                                     & _LANDING_MASKS[dx] & ~own)
+
+            # A ray stops at the first piece on it, so two pieces' rays in
+            # the same direction never share a square
+            for sliders, directions in ((straight, Board.ROOK_DIRECTIONS),
+                                        (diagonal, Board.BISHOP_DIRECTIONS)):
+                for dx, dy in directions:
+                    moves += _count_bits(_slide(sliders, empty, dx, dy)
+                                         & ~own)
+
+            total += sign*moves
+
+        return total
+
+    def evaluate(self, mobility_weight=MOBILITY_WEIGHT):
+        """Return a score for each position: material, plus piece-square
+        scores, plus mobility_weight centipawns per move of mobility.
+        """
+
+        return (self.material() + self.piece_square()
+                + mobility_weight*self.mobility())
@@ -0,0 +1,191 @@
+"""Contains the tables and functions used to score positions
+
+Every Board keeps Board.score, the material and piece-square score of its
+position, up to date in place_piece using SQUARE_SCORES, just as it keeps
+its Zobrist hash. So the score is always ready to read, however many moves
+have been made and taken back. AIs which want more than this can register
+extra terms with an Evaluator.
+
+Scores are in centipawns (hundredths of a pawn) from white's point of
+view: positive when white is better.
+
+"""
+
+from Piece import PieceType as p_type
+from Piece import PieceColour as Colour
+
+# Piece values in centipawns, indexed by PieceType
+PIECE_VALUES = (0, 0, 900, 330, 320, 500, 100)
+
+# Piece-square tables in centipawns, indexed [PieceType][square], for the
+# white pieces. Squares are numbered as in Board (x + 8*y), so each table
+# reads like the board from white's side, rank 8 first. Black uses the
+# table flipped top to bottom.
+PIECE_SQUARE_TABLES = (
+    (0,)*64,
+    # king: stay behind the pawns
+    (-30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -20, -30, -30, -40, -40, -30, -30, -20,
+     -10, -20, -20, -20, -20, -20, -20, -10,
+     20, 20, 0, 0, 0, 0, 20, 20,
+     20, 30, 10, 0, 0, 10, 30, 20),
+    # queen
+    (-20, -10, -10, -5, -5, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 5, 5, 5, 0, -10,
+     -5, 0, 5, 5, 5, 5, 0, -5,
+     0, 0, 5, 5, 5, 5, 0, -5,
+     -10, 5, 5, 5, 5, 5, 0, -10,
+     -10, 0, 5, 0, 0, 0, 0, -10,
+     -20, -10, -10, -5, -5, -10, -10, -20),
+    # bishop
+    (-20, -10, -10, -10, -10, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 10, 10, 5, 0, -10,
+     -10, 5, 5, 10, 10, 5, 5, -10,
+     -10, 0, 10, 10, 10, 10, 0, -10,
+     -10, 10, 10, 10, 10, 10, 10, -10,
+     -10, 5, 0, 0, 0, 0, 5, -10,
+     -20, -10, -10, -10, -10, -10, -10, -20),
+    # knight
+    (-50, -40, -30, -30, -30, -30, -40, -50,
+     -40, -20, 0, 0, 0, 0, -20, -40,
+     -30, 0, 10, 15, 15, 10, 0, -30,
+     -30, 5, 15, 20, 20, 15, 5, -30,
+     -30, 0, 15, 20, 20, 15, 0, -30,
+     -30, 5, 10, 15, 15, 10, 5, -30,
+     -40, -20, 0, 5, 5, 0, -20, -40,
+     -50, -40, -30, -30, -30, -30, -40, -50),
+    # rook
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     5, 10, 10, 10, 10, 10, 10, 5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     0, 0, 0, 5, 5, 0, 0, 0),
+    # pawn
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+     5, 5, 10, 25, 25, 10, 5, 5,
+     0, 0, 0, 20, 20, 0, 0, 0,
+     5, -5, -10, 0, 0, -10, -5, 5,
+     5, 10, 10, -20, -20, 10, 10, 5,
+     0, 0, 0, 0, 0, 0, 0, 0),
+)
+
+# SQUARE_SCORES[colour][type][sq] is the change in Board.score when a piece
+# of that colour and type is placed on square sq. Indexed like
+# Board.piece_bb, with zeros for PieceType.blank.
+SQUARE_SCORES = [None,
+                 [[PIECE_VALUES[piece_type] + table[sq] for sq in range(64)]
+                  for piece_type, table in enumerate(PIECE_SQUARE_TABLES)],
+                 [[-PIECE_VALUES[piece_type] - table[sq ^ 56]
+                   for sq in range(64)]
+                  for piece_type, table in enumerate(PIECE_SQUARE_TABLES)]]
+
+# Centipawns lost for each attack by an enemy piece on a square next to
+# (or under) the king
+KING_ATTACK_PENALTY = 10
+
+
+def material(board, values=PIECE_VALUES):
+    """Return the material balance of a board, from its piece counts.
+
+    Args:
+        - board:  a Board
+        - values:  the value of each piece, indexed by PieceType
+
+    """
+
+    white = board.piece_counts[Colour.white]
+    black = board.piece_counts[Colour.black]
+
+    return sum(values[piece_type]*(white[piece_type] - black[piece_type])
+               for piece_type in (p_type.queen, p_type.bishop, p_type.knight,
+                                  p_type.rook, p_type.pawn))
+
+
+def king_safety(board):
+    """Return minus KING_ATTACK_PENALTY for each attack by an enemy piece
+    on the squares around each king. An extra term for an Evaluator.
+    """
+
+    occupied = board.get_occupied()
+    score = 0
+
+    for colour in (Colour.white, Colour.black):
+        king_sq = board.king_squares[colour]
+
+        if king_sq is None:
+            continue
+
+        enemies = board.piece_bb[-colour][p_type.blank]
+        x, y = king_sq & 7, king_sq >> 3
+        attacks = 0
+
+        for zone_x in range(max(x - 1, 0), min(x + 2, 8)):
+            for zone_y in range(max(y - 1, 0), min(y + 2, 8)):
+                attackers = board.get_attackers(zone_x + 8*zone_y, occupied)
+                attacks += bin(attackers & enemies).count("1")
+
+        score -= colour*KING_ATTACK_PENALTY*attacks
+
+    return score
+
+
+class Evaluator:
+
+    """Scores positions as Board.score plus any extra terms registered.
+
+    An extra term is a function which takes a Board and returns a score in
+    centipawns from white's point of view, eg. king_safety. Each is added
+    to the score with a weight.
+
+    Attributes:
+        - terms:  a list of (function, weight) pairs
+
+    """
+
+    def __init__(self):
+        """Create an evaluator with no extra terms."""
+        self.terms = []
+
+    def add_term(self, term, weight=1):
+        """Register an extra term.
+
+        Args:
+            - term:  a function taking a Board and returning a score
+            - weight:  the number the term's score is multiplied by
+
+        """
+
+        self.terms.append((term, weight))
+
+    def remove_term(self, term):
+        """Remove every registration of an extra term."""
+        self.terms = [(registered, weight) for registered, weight in self.terms
+                      if registered != term]
+
+    def evaluate(self, board, colour=Colour.white):
+        """Return the score of a board from the point of view of a colour.
+
+        Args:
+            - board:  a Board
+            - colour:  a member of the Piece.PieceColour enum. The score is
+                       negated for black, so that it is always positive
+                       when colour is better.
+
+        """
+
+        score = board.score
+
+        for term, weight in self.terms:
+            score += weight*term(board)
+
+        return colour*score
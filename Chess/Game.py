@@ -15,6 +15,9 @@ import time
 # Size of the board canvas to render in pixels
 BOARD_SIZE = 900
 
+# Seconds an AI player may take to choose each move
+DEFAULT_MOVE_TIME = 5
+
 
 class Game:
 
@@ -29,6 +32,9 @@ class Game:
         -listen: boolean for whether the UI should listen for user
                  click events.
         -ui_draw: true if we are drawing to the ui
+        -move_time: seconds each AI player is given to choose a move, or
+                    None for no limit. AI modules whose get_move does not
+                    take a deadline are not limited.
         -game_state: current state of the game
 
     UI elements:
@@ -46,7 +52,8 @@ class Game:
 
     """
 
-    def __init__(self, player1, player2, ui_draw=False):
+    def __init__(self, player1, player2, ui_draw=False,
+                 move_time=DEFAULT_MOVE_TIME):
         """ Start a game against the two selected types of player and build UI.
         """
 
@@ -54,6 +61,7 @@ class Game:
         self.player2 = player2
 
         self.ui_draw = ui_draw
+        self.move_time = move_time
         self.board_canvas = None
 
         if (player1 == "Human"):
@@ -217,7 +225,11 @@ class Game:
 
         current_player = self.get_current_player()
 
-        move = current_player.get_move(self.game_state)
+        deadline = None
+        if self.move_time is not None:
+            deadline = time.perf_counter() + self.move_time
+
+        move = current_player.get_move(self.game_state, deadline)
         move_SAN = self.game_state.get_san(move)
         self.game_state.make_move(move, self.board_canvas)
         promote_piece = self.ai_promote_pawn(current_player.colour)
@@ -319,7 +331,8 @@ class Game:
         elif status == g_status.black_win:
             f.write("# 0-1")
         elif status in (g_status.king_draw, g_status.stalemate,
-                        g_status.agreement_draw, g_status.fifty_move_draw):
+                        g_status.agreement_draw, g_status.fifty_move_draw,
+                        g_status.material_draw, g_status.repetition_draw):
             f.write(" 1/2-1/2")
         else:
             f.write(" ")
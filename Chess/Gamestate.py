@@ -3,6 +3,7 @@
 from enum import Enum
 import Board
 import Move
+import Zobrist
 from Piece import *
 from Piece import PieceColour as colour
 from Piece import PieceType as p_type
@@ -23,6 +24,8 @@ class Status(Enum):
     fifty_move_draw = 4
     king_draw = 5
     agreement_draw = 6
+    material_draw = 7
+    repetition_draw = 8
 
 
 class Gamestate:
@@ -46,13 +49,51 @@ class Gamestate:
                   - selected_piece_moves: list of moves available to the 
                      selected piece
                   - selected_piece: position of the selected piece
+                  - state_hash: the XOR of the Zobrist keys for the side to
+                     move, castling rights and en passant square. Together
+                     with board.zobrist this gives the position's hash.
+                  - undo_stack: a record for each move made with push,
+                     holding what pop needs to undo it
+                  - move_cache: the codes (see Move.encode) of the moves
+                     returned by get_all_moves for the current position,
+                     keyed by the position's hash
+                     (without the side to move), colour and promotions.
+                     Emptied whenever a move is made or undone.
+                  - move_cache_hits: the number of times get_all_moves was
+                     answered from move_cache
+                  - move_cache_misses: the number of times get_all_moves
+                     had to generate the moves
+                  - position_history: the hash of each position reached
+                     since the last capture or pawn move (which can not be
+                     repeated past), ending with the current position
+                  - position_counts: a dict of how many times each hash in
+                     position_history occurs, to find repetitions quickly
     """
 
-    def __init__(self):
+    START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+    def __init__(self, fen=None):
         """ Constructor for the game state - defaults to start of a game.
+
+            Args:
+                - fen: if given, a FEN string of the position to start from
+                   instead (see set_fen)
         """
 
         self.board = Board.Board()
+
+        self.move_cache = {}
+        self.move_cache_hits = 0
+        self.move_cache_misses = 0
+
+        self.selected_piece = None
+        self.selected_piece_moves = []
+        self.king_in_check = False
+
+        if fen is not None:
+            self.set_fen(fen)
+            return
+
         self.board.setup()
 
         # Set castling to true
@@ -66,12 +107,24 @@ class Gamestate:
         self.fifty_move_count = 0
 
         self.en_passant_sq = None
-        self.selected_piece = None
-        self.selected_piece_moves = []
-
-        self.king_in_check = False
         self.is_white_turn = True
 
+        self.state_hash = self.get_rights_hash()
+        self.undo_stack = []
+
+        self.clear_history()
+        self.record_position()
+
+    @property
+    def hash(self):
+        """ A 64 bit Zobrist hash of the position.
+
+            This covers the pieces, side to move, castling rights and en
+            passant square, and is kept up to date as moves are made.
+        """
+
+        return self.board.zobrist ^ self.state_hash
+
     def draw(self, canvas):
         """ Draw the gamestate to a Tkinter canvas element.
 
@@ -155,9 +208,71 @@ class Gamestate:
                 - canvas: canvas to be drawn onto
         """
 
+        self.move_cache.clear()
         self.update_counts(move)
         self.board.make_move(move)
 
+    def push(self, move):
+        """ Make a move and pass the turn, so that it can be undone by pop.
+
+            Unlike make_move, this also handles promotion and swaps the turn,
+            so that a search can play a line of moves forward and back on
+            one Gamestate. A pawn reaching the back rank is promoted to
+            move.promotion, or to a queen if that is None.
+
+            Args:
+                - move: a legal move for the player whose turn it is
+        """
+
+        board = self.board
+        end = move.end_posn
+        piece = board.squares[move.start_posn[0] + 8*move.start_posn[1]]
+
+        if (piece.type == p_type.pawn and end[1] in (0, 7)
+                and not move.promotion):
+            move = Move.Move(move.start_posn, end, take_move=move.take_move,
+                             promotion=p_type.queen)
+
+        self.undo_stack.append((move, board.squares[end[0] + 8*end[1]],
+                                self.w_castle_K, self.w_castle_Q,
+                                self.b_castle_K, self.b_castle_Q,
+                                self.en_passant_sq, self.fifty_move_count,
+                                self.state_hash, self.position_history,
+                                self.position_counts))
+
+        self.move_cache.clear()
+        self.update_counts(move)
+        board.make_move(move)
+        self.swap_turn()
+
+    def pop(self):
+        """ Undo the last move made with push and return it.
+
+            Raises:
+                - IndexError if there is no move to undo
+        """
+
+        # Forget the position the move reached. If the move cleared the
+        # history, the old one is restored below instead.
+        key = self.position_history.pop()
+        if self.position_counts[key] > 1:
+            self.position_counts[key] -= 1
+        else:
+            del self.position_counts[key]
+
+        (move, taken_piece, self.w_castle_K, self.w_castle_Q,
+         self.b_castle_K, self.b_castle_Q, self.en_passant_sq,
+         self.fifty_move_count, self.state_hash, self.position_history,
+         self.position_counts) = self.undo_stack.pop()
+
+        self.move_cache.clear()
+        self.board.takeback_move(move, taken_piece)
+
+        self.count -= 1
+        self.is_white_turn = not self.is_white_turn
+
+        return move
+
     def update_counts(self, move):
         """ Update counters and set en passant square if appropriate.
 
@@ -166,6 +281,7 @@ class Gamestate:
         """
 
         piece = self.board.get_piece(*move.start_posn)
+        old_rights_hash = self.get_rights_hash()
 
         # increment move counter
         self.count += 1
@@ -185,25 +301,25 @@ class Gamestate:
                 self.b_castle_K = False
                 self.b_castle_Q = False
 
-        # Check whether a corner rook has moved
+        # Check whether a corner rook has moved or been taken
         # Note: It is unnecessary to check piece colour
         # as, for example, a white rook on A8 means the
         # black rook must have moved
-        if(piece.type == PieceType.rook):
+        for posn in (move.start_posn, move.end_posn):
 
-            if(move.start_posn == (0, 0)):
+            if(posn == (0, 0)):
 
                 self.b_castle_Q = False
 
-            elif(move.start_posn == (7, 0)):
+            elif(posn == (7, 0)):
 
                 self.b_castle_K = False
 
-            elif(move.start_posn == (0, 7)):
+            elif(posn == (0, 7)):
 
                 self.w_castle_Q = False
 
-            elif(move.start_posn == (7, 7)):
+            elif(posn == (7, 7)):
 
                 self.w_castle_K = False
 
@@ -221,89 +337,301 @@ class Gamestate:
                     self.en_passant_sq = (move.start_posn[0],
                                           move.start_posn[1] + 1)
 
-        # check whether there has been a capture
+        # check whether there has been a capture or pawn move
 
-        if(self.board.is_take_move(move)):
+        if(self.board.is_take_move(move) or piece.type == PieceType.pawn):
 
             # reset counter
             self.fifty_move_count = 0
+
+            # No earlier position can occur again
+            self.clear_history()
         else:
 
             self.fifty_move_count += 1
 
+        self.state_hash ^= old_rights_hash ^ self.get_rights_hash()
+
+    def set_fen(self, fen):
+        """ Set up the game state from a FEN string.
+
+            The board, side to move, castling rights, en passant square and
+            both counters are all set, and any moves made with push are
+            forgotten. The two counters may be left off, as in EPD files,
+            in which case they are set as for a new game.
+
+            Args:
+                - fen: eg. Gamestate.START_FEN
+
+            Raises:
+                - ValueError if fen is not a valid FEN string
+        """
+
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6:
+            raise ValueError("FEN needs 4 to 6 fields: " + fen)
+
+        placement, turn, rights, en_passant = fields[:4]
+
+        if turn not in ("w", "b"):
+            raise ValueError("Bad FEN side to move: " + turn)
+        if rights != "-" and (not rights or rights.strip("KQkq")):
+            raise ValueError("Bad FEN castling rights: " + rights)
+
+        if en_passant == "-":
+            en_passant_sq = None
+        elif (len(en_passant) == 2 and en_passant[0] in "abcdefgh"
+                and en_passant[1] in "36"):
+            en_passant_sq = (ord(en_passant[0]) - ord("a"),
+                             8 - int(en_passant[1]))
+        else:
+            raise ValueError("Bad FEN en passant square: " + en_passant)
+
+        try:
+            fifty_move_count = int(fields[4]) if len(fields) > 4 else 0
+            move_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("Bad FEN move counters: " + fen)
+
+        self.board.set_forsyth(placement)
+
+        self.is_white_turn = turn == "w"
+        self.w_castle_K = "K" in rights
+        self.w_castle_Q = "Q" in rights
+        self.b_castle_K = "k" in rights
+        self.b_castle_Q = "q" in rights
+        self.en_passant_sq = en_passant_sq
+
+        self.fifty_move_count = fifty_move_count
+        self.count = 2*(max(move_number, 1) - 1) + (not self.is_white_turn)
+
+        self.state_hash = self.get_rights_hash()
+        if not self.is_white_turn:
+            self.state_hash ^= Zobrist.BLACK_TO_MOVE
+
+        self.undo_stack = []
+        self.move_cache.clear()
+
+        self.clear_history()
+        self.record_position()
+
+    def get_fen(self):
+        """ Return the game state as a FEN string.
+        """
+
+        rights = ""
+        if self.w_castle_K:
+            rights += "K"
+        if self.w_castle_Q:
+            rights += "Q"
+        if self.b_castle_K:
+            rights += "k"
+        if self.b_castle_Q:
+            rights += "q"
+
+        if self.en_passant_sq is None:
+            en_passant = "-"
+        else:
+            en_passant = (Board.Board.FILE_LABELS[self.en_passant_sq[0]]
+                          + str(8 - self.en_passant_sq[1]))
+
+        return (self.board.get_forsyth()
+                + ("w " if self.is_white_turn else "b ")
+                + (rights or "-") + " " + en_passant + " "
+                + str(self.fifty_move_count) + " "
+                + str(self.count//2 + 1))
+
+    def get_rights_hash(self):
+        """ Return the XOR of the Zobrist keys for the castling rights and
+            en passant square (but not the side to move).
+        """
+
+        rights_hash = 0
+
+        if self.w_castle_K:
+            rights_hash ^= Zobrist.W_CASTLE_K
+        if self.w_castle_Q:
+            rights_hash ^= Zobrist.W_CASTLE_Q
+        if self.b_castle_K:
+            rights_hash ^= Zobrist.B_CASTLE_K
+        if self.b_castle_Q:
+            rights_hash ^= Zobrist.B_CASTLE_Q
+
+        if self.en_passant_sq is not None:
+            rights_hash ^= Zobrist.EN_PASSANT_KEYS[self.en_passant_sq[0]]
+
+        return rights_hash
+
+    def compute_hash(self):
+        """ Return the position's hash worked out from scratch.
+
+            This should always equal self.hash, and is used to set up the
+            hash when a position is built by hand.
+        """
+
+        position_hash = self.get_rights_hash()
+
+        if not self.is_white_turn:
+            position_hash ^= Zobrist.BLACK_TO_MOVE
+
+        for sq, piece in enumerate(self.board.squares):
+            if piece.type != p_type.blank:
+                position_hash ^= \
+                    Zobrist.PIECE_KEYS[piece.colour][piece.type][sq]
+
+        return position_hash
+
     def get_piece_moves(self, square):
 
-        p_moves = []
-        piece = self.board.piece_array[square[0]][square[1]]
+        piece = self.board.get_piece(*square)
 
-        p_moves.extend(self.board.get_piece_moves(*square))
+        if piece.type == p_type.blank:
+            return []
 
-        if piece.type == p_type.pawn and self.en_passant_sq is not None:
+        # Picked out of the (cached) moves for the whole side
+        return [move for move in self.get_all_moves(piece.colour)
+                if move.start_posn == square]
 
+    def get_en_passant_moves(self, colour):
+        """ Return the legal en passant moves for the coloured player.
 
-            if(abs(square[0] - self.en_passant_sq[0]) == 1 and
-               abs(square[1] - self.en_passant_sq[1]) == 1):
+            Args:
+                - colour: colour of the player
+        """
 
+        if self.en_passant_sq is None:
+            return []
 
-                pawn_square = (self.en_passant_sq[0], square[1])
+        ep_x, ep_y = self.en_passant_sq
 
-                p_moves.append(Move.Move((square[0], square[1]),
-                                         self.en_passant_sq,
-                                         en_passant=True,
-                                         en_passant_posn=pawn_square,
-                                         take_move=True))
+        # Pawns which could take on the en passant square are those on the
+        # squares an enemy pawn there would attack
+        pawns = (Board.PAWN_ATTACKS[-colour][ep_x + 8*ep_y]
+                 & self.board.piece_bb[colour][p_type.pawn])
 
-        elif(piece.type == p_type.king):
+        p_moves = []
 
-            if(self.w_castle_K == True and square[1] == 7):
+        while pawns:
+            lsb = pawns & -pawns
+            pawns ^= lsb
+            sq = lsb.bit_length() - 1
 
-                castle = Move.Move((4, 7), (6, 7), castle=True)
-                if(self.board.is_possible_valid_move(castle)):
+            move = Move.Move((sq & 7, sq >> 3), self.en_passant_sq,
+                             en_passant=True,
+                             en_passant_posn=(ep_x, sq >> 3),
+                             take_move=True)
 
-                    p_moves.append(castle)
+            # The captured pawn leaves the board along with the moving pawn,
+            # so pins worked out for the board can not be relied on here
+            if self.board.is_valid_move(move):
+                p_moves.append(move)
 
-            if(self.w_castle_Q == True and square[1] == 7):
+        return p_moves
 
-                castle = Move.Move((4, 7), (2, 7), castle=True)
-                if(self.board.is_possible_valid_move(castle)):
+    def get_castle_moves(self, colour):
+        """ Return the legal castling moves for the coloured player.
 
-                    p_moves.append(castle)
+            Args:
+                - colour: colour of the player
+        """
 
-            if(self.b_castle_K == True and square[1] == 0):
+        if colour == PieceColour.white:
+            rights = ((self.w_castle_K, (4, 7), (6, 7)),
+                      (self.w_castle_Q, (4, 7), (2, 7)))
+        else:
+            rights = ((self.b_castle_K, (4, 0), (6, 0)),
+                      (self.b_castle_Q, (4, 0), (2, 0)))
 
-                castle = Move.Move((4, 0), (6, 0), castle=True)
-                if(self.board.is_possible_valid_move(castle)):
+        p_moves = []
 
-                    p_moves.append(castle)
+        for allowed, start_posn, end_posn in rights:
 
-            if(self.b_castle_Q == True and square[1] == 0):
+            if allowed:
 
-                castle = Move.Move((4, 0), (2, 0), castle=True)
+                castle = Move.Move(start_posn, end_posn, castle=True)
                 if(self.board.is_possible_valid_move(castle)):
 
                     p_moves.append(castle)
 
         return p_moves
 
-    def get_all_moves(self, colour):
+    def get_all_moves(self, colour, promotions=False):
         """ Return all the legal moves that the coloured player can make.
             (includes castling and en passant moves)
 
             Args:
                 - colour: colour of the player
+                - promotions: if true, give a separate move for each piece a
+                   pawn can be promoted to, as perft counts them
+
+            The moves are kept in move_cache, as move codes, until a move is
+            made, so asking again for the same position (eg. from get_status
+            and then from the next player) does not generate them again.
+            Each call returns a new list of new Moves, which the caller may
+            change.
         """
 
-        moves = []
+        key = self.get_move_cache_key(colour, promotions)
+        codes = self.move_cache.get(key)
+
+        if codes is None:
+            self.move_cache_misses += 1
 
-        for i in range(Board.Board.SIZE):
-            for j in range(Board.Board.SIZE):
+            moves = self.board.get_legal_moves(colour, promotions)
+            moves.extend(self.get_en_passant_moves(colour))
+            moves.extend(self.get_castle_moves(colour))
 
-                piece = self.board.piece_array[i][j]
+            self.move_cache[key] = [move.code for move in moves]
+            return moves
 
-                if(piece.type != p_type.blank and piece.colour == colour):
-                    moves.extend(self.get_piece_moves((i, j)))
+        self.move_cache_hits += 1
 
-        return moves
+        from_code = Move.Move.from_code
+        return [from_code(code) for code in codes]
+
+    def iter_moves(self, colour, promotions=False):
+        """ Yield the legal moves that the coloured player can make one at a
+            time, in the same order as get_all_moves. Moves are only
+            generated as they are needed, so stopping early is cheap.
+
+            Args:
+                - colour: colour of the player
+                - promotions: as for get_all_moves
+        """
+
+        yield from self.board.iter_moves(colour, promotions)
+        yield from self.get_en_passant_moves(colour)
+        yield from self.get_castle_moves(colour)
+
+    def iter_staged_moves(self, colour, promotions=False):
+        """ Yield the legal moves that the coloured player can make in three
+            stages: captures (most valuable victim first, then least
+            valuable attacker), promotions, then quiet moves.
+
+            Each stage is only generated once the moves of the one before
+            have all been taken, so an alpha-beta search which cuts off
+            early never pays for the later stages. En passant captures come
+            at the end of the captures and castling at the end of the quiet
+            moves. See Board.iter_code_stages.
+
+            Args:
+                - colour: colour of the player
+                - promotions: as for get_all_moves
+        """
+
+        from_code = Move.Move.from_code
+        stages = self.board.iter_code_stages(colour, promotions)
+
+        for code in next(stages):
+            yield from_code(code)
+        yield from self.get_en_passant_moves(colour)
+
+        for code in next(stages):
+            yield from_code(code)
+
+        for code in next(stages):
+            yield from_code(code)
+        yield from self.get_castle_moves(colour)
 
     def can_promote_pawn(self, colour):
         """ Check if a pawn can be promoted.
@@ -319,6 +647,41 @@ class Gamestate:
         """
 
         self.is_white_turn = not self.is_white_turn
+        self.state_hash ^= Zobrist.BLACK_TO_MOVE
+
+        # The move is now complete, with the other player to move
+        self.record_position()
+
+    def clear_history(self):
+        """ Forget the positions reached so far, eg. after a capture.
+
+            New objects are made rather than emptying the old ones, so that
+            pop can put the old history back.
+        """
+
+        self.position_history = []
+        self.position_counts = {}
+
+    def record_position(self):
+        """ Add the current position to position_history.
+        """
+
+        key = self.hash
+        self.position_history.append(key)
+        self.position_counts[key] = self.position_counts.get(key, 0) + 1
+
+    def is_repetition(self, times=3):
+        """ Return true if the current position, with the same player to
+            move, castling rights and en passant square, has occurred at
+            least the given number of times (counting this one).
+
+            A search can use times=2 to score any repeat as a draw.
+
+            Args:
+                - times: the number of occurrences to look for
+        """
+
+        return self.position_counts.get(self.hash, 0) >= times
 
     def is_piece_selected(self):
 
@@ -339,14 +702,41 @@ class Gamestate:
 
         return self.board.get_san(move)
 
+    def get_san_list(self, moves):
+        """ Return the SAN strings for a list of moves in one pass.
+
+            Args:
+                - moves: moves for the player whose turn it is, eg. from
+                   get_all_moves
+        """
+
+        return self.board.get_san_list(moves)
+
+    def get_move_cache_key(self, colour, promotions=False):
+        """ Return the move_cache key for the coloured player's moves in the
+            current position.
+        """
+
+        # The moves do not depend on whose turn it is, so the side to move
+        # is left out of the key
+        return (self.board.zobrist,
+                self.state_hash ^ (0 if self.is_white_turn
+                                   else Zobrist.BLACK_TO_MOVE),
+                colour, promotions)
+
     def legal_move_exists(self, colour):
 
-        # if statement returns true if list of moves is empty
-        if(not self.get_all_moves(colour)):
-            return False
-        else:
+        # Uses the cached moves if there are any, otherwise stops at the
+        # first legal move found
+        moves = self.move_cache.get(self.get_move_cache_key(colour))
+        if moves is not None:
+            return bool(moves)
+
+        for move in self.iter_moves(colour):
             return True
 
+        return False
+
     def get_status(self):
         """Return a member of the Status enum."""
 
@@ -365,9 +755,20 @@ class Gamestate:
             return Status.fifty_move_draw
         if self.board.is_king_draw():
             return Status.king_draw
+        if self.board.is_insufficient_material():
+            return Status.material_draw
+
+        # The turn has not been swapped yet, so the position just reached
+        # (with the enemy to move) is not yet in position_counts
+        key = self.hash ^ Zobrist.BLACK_TO_MOVE
+        if self.position_counts.get(key, 0) >= 2:
+            return Status.repetition_draw
 
         in_check = self.board.is_in_check(enemy_colour)
-        legal_move_exists = self.legal_move_exists(enemy_colour)
+
+        # The enemy will need its moves next turn, so generate them all
+        # here (filling move_cache) rather than stopping at the first one
+        legal_move_exists = bool(self.get_all_moves(enemy_colour))
 
         if (not legal_move_exists) and in_check:
             return win
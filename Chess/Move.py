@@ -1,7 +1,39 @@
-"""Contains the Move class"""
+"""Contains the Move class and the packed integer move encoding"""
+
+import array
 # Tkinter graphics package
 from tkinter import *
 
+# A move can be packed into an int (a "move code") so that lists of moves can
+# be held in compact arrays during move generation. Squares are numbered
+# x + 8*y, as in Board. The bits of a code are:
+#   0-5:    the start square
+#   6-11:   the end square
+#   12-15:  the flags below
+#   16-18:  the PieceType a pawn is promoted to, or 0 for no promotion
+CAPTURE = 1
+CASTLE = 2
+EN_PASSANT = 4
+
+FROM_SHIFT = 0
+TO_SHIFT = 6
+FLAGS_SHIFT = 12
+PROMOTION_SHIFT = 16
+
+# (x, y) tuples for each square, shared by every move
+_POSNS = tuple((sq & 7, sq >> 3) for sq in range(64))
+
+
+def encode(start_sq, end_sq, flags=0, promotion=0):
+    """Return the move code for the passed squares, flags and promotion."""
+    return (start_sq | end_sq << TO_SHIFT | flags << FLAGS_SHIFT
+            | promotion << PROMOTION_SHIFT)
+
+
+def new_code_list():
+    """Return an empty array suitable for holding move codes."""
+    return array.array("L")
+
 
 class Move:
 
@@ -17,11 +49,17 @@ class Move:
                     square the piece (king if castling move) is moving to
         - en_passant_posn:  if en_passant, this is a tuple containing the x and
                             y values of the pawn which will be taken by the move
+        - promotion:  the member of the PieceType enum a pawn making the move
+                      is promoted to, or None. Moves for the Game leave this
+                      as None and ask the player for a promotion afterwards.
 
     """
 
+    __slots__ = ("start_posn", "end_posn", "castle", "take_move",
+                 "en_passant", "en_passant_posn", "promotion")
+
     def __init__(self, start_posn, end_posn, take_move=False, castle=False,
-                 en_passant=False, en_passant_posn=None):
+                 en_passant=False, en_passant_posn=None, promotion=None):
         """Initialise a move according to passed parameters.
 
         Raises:
@@ -42,16 +80,64 @@ class Move:
         self.take_move = take_move
         self.en_passant = en_passant
         self.en_passant_posn = en_passant_posn
+        self.promotion = promotion
+
+    @staticmethod
+    def from_code(code):
+        """Return the Move for a move code (see encode)."""
+
+        start = code & 63
+        end = (code >> TO_SHIFT) & 63
+        flags = (code >> FLAGS_SHIFT) & 15
+
+        if flags & EN_PASSANT:
+            return Move(_POSNS[start], _POSNS[end], take_move=True,
+                        en_passant=True,
+                        en_passant_posn=_POSNS[(end & 7) + (start & 56)])
+
+        return Move(_POSNS[start], _POSNS[end],
+                    take_move=bool(flags & CAPTURE),
+                    castle=bool(flags & CASTLE),
+                    promotion=(code >> PROMOTION_SHIFT) or None)
+
+    @property
+    def code(self):
+        """The move code (see encode) for this move."""
+
+        flags = 0
+        if self.take_move:
+            flags |= CAPTURE
+        if self.castle:
+            flags |= CASTLE
+        if self.en_passant:
+            flags |= EN_PASSANT
+
+        return encode(self.start_posn[0] + 8*self.start_posn[1],
+                      self.end_posn[0] + 8*self.end_posn[1],
+                      flags, self.promotion or 0)
 
     def __eq__(self, other):
-        return (self.start_posn == other.start_posn
-                and self.end_posn == other.colour
-                and self.castle == other.castle
-                and self.en_passant == other.en_passant
-                and self.en_passant_posn == other.en_passant_posn)
+        try:
+            return (self.start_posn == other.start_posn
+                    and self.end_posn == other.end_posn
+                    and self.castle == other.castle
+                    and self.en_passant == other.en_passant
+                    and self.en_passant_posn == other.en_passant_posn
+                    and self.promotion == other.promotion)
+        except AttributeError:
+            return NotImplemented
 
     def __ne__(self, other):
-        return not self.__eq__(other)
+        equal = self.__eq__(other)
+
+        if equal is NotImplemented:
+            return equal
+
+        return not equal
+
+    def __hash__(self):
+        return hash((self.start_posn, self.end_posn, bool(self.castle),
+                     bool(self.en_passant), self.promotion))
 
     def set_taking_move(self):
 
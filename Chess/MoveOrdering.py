@@ -0,0 +1,163 @@
+"""Contains the MoveOrdering class, which decides the order a search tries
+moves in
+
+Alpha-beta search stops looking at a position's moves as soon as one is
+good enough for a cutoff, so the sooner the best move is tried the fewer
+positions are searched. The order used is:
+
+    1. the hash move (the best move stored in the transposition table)
+    2. captures, most valuable victim first, then least valuable attacker
+       (see Board.iter_code_stages), then en passant captures
+    3. promotions which do not capture
+    4. the two killer moves of the ply: quiet moves which recently caused
+       a cutoff at the same distance from the root
+    5. other quiet moves, by their history score: how often and how deep
+       a move between the same two squares has caused a cutoff
+    6. castling
+
+"""
+
+import Move
+from Piece import PieceType as p_type
+
+# Number of killer moves kept for each ply
+KILLER_SLOTS = 2
+
+
+class MoveOrdering:
+
+    """Orders moves for a search and learns from its cutoffs.
+
+    A search asks for a position's moves with iter_moves and reports each
+    cutoff with record_cutoff. Moves are generated in stages, so the quiet
+    moves are never generated if the hash move or a capture cuts off.
+
+    Attributes:
+        - killers:  a list for each ply of the codes (see Move.encode) of its
+                    killer moves, most recent first, with 0 for an empty slot
+        - history:  the history score of each move, indexed by its start
+                    square + 64*its end square (the low 12 bits of its
+                    code)
+        - cutoffs:  the number of cutoffs recorded
+        - first_move_cutoffs:  the number of those made by the first move
+                               tried
+
+    """
+
+    def __init__(self):
+        """Create an ordering with no killer moves or history."""
+
+        self.killers = []
+        self.history = [0]*(64*64)
+
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        """Forget the killer moves and reset the statistics before a new
+        search. History scores are halved, so that those from earlier
+        positions count for less."""
+
+        self.killers = []
+        self.history = [score >> 1 for score in self.history]
+
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def iter_moves(self, game_state, colour, ply, hash_code=0):
+        """Yield the legal moves of a colour in the order they should be
+        searched, as Moves.
+
+        Pawns reaching the back rank are promoted to queens when the move
+        is played (see Gamestate.push).
+
+        Args:
+            - game_state:  a Gamestate
+            - colour:  a member of the Piece.PieceColour enum
+            - ply:  the number of half moves from the root of the search
+            - hash_code:  the code of the hash move, or 0 for none. It must
+                          be legal in the position.
+
+        """
+
+        from_code = Move.Move.from_code
+
+        if hash_code:
+            yield from_code(hash_code)
+
+        stages = game_state.board.iter_code_stages(colour)
+
+        for code in next(stages):
+            if code != hash_code:
+                yield from_code(code)
+        for move in game_state.get_en_passant_moves(colour):
+            if move.code != hash_code:
+                yield move
+
+        for code in next(stages):
+            if code != hash_code:
+                yield from_code(code)
+
+        quiets = next(stages)
+
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        for code in killers:
+            if code and code != hash_code and code in quiets:
+                yield from_code(code)
+
+        history = self.history
+        quiets.sort(key=lambda code: history[code & 4095], reverse=True)
+
+        for code in quiets:
+            if code != hash_code and code not in killers:
+                yield from_code(code)
+
+        for move in game_state.get_castle_moves(colour):
+            if move.code != hash_code:
+                yield move
+
+    def record_cutoff(self, game_state, move, ply, depth, move_number):
+        """Record that a move caused a beta cutoff.
+
+        Quiet moves become killers for the ply, and their history score
+        grows by the square of the depth left, so that cutoffs near the
+        root count for more.
+
+        Args:
+            - game_state:  the Gamestate the move was played in, after it
+                           has been taken back
+            - move:  the Move
+            - ply:  the number of half moves from the root to the position
+                    the move was played in
+            - depth:  the depth that position was searched to
+            - move_number:  the number of moves tried before it
+
+        """
+
+        self.cutoffs += 1
+        if not move_number:
+            self.first_move_cutoffs += 1
+
+        if move.take_move or move.castle:
+            return
+
+        # Pawns reaching the back rank are promotions, not quiet moves
+        if (move.end_posn[1] in (0, 7) and game_state.board.get_piece(
+                *move.start_posn).type == p_type.pawn):
+            return
+
+        code = move.code
+
+        while len(self.killers) <= ply:
+            self.killers.append([0]*KILLER_SLOTS)
+
+        killers = self.killers[ply]
+        if killers[0] != code:
+            killers.insert(0, code)
+            killers.pop()
+
+        self.history[code & 4095] += depth*depth
+
+    def first_move_cutoff_rate(self):
+        """Return the fraction of cutoffs made by the first move tried."""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0
@@ -21,7 +21,12 @@ class PieceColour():
 
 
 def make_piece(piece_type, colour):
-    """Return a piece of the correct subclass given the passed attributes.
+    """Return the shared piece of the correct subclass for the passed
+    attributes.
+
+    Pieces are immutable, so one instance of each type and colour (and one
+    blank piece) is created when this module is loaded and reused by every
+    board.
 
     Args:
         - piece_type:  a member of the PieceType enum
@@ -29,35 +34,48 @@ def make_piece(piece_type, colour):
 
     """
 
-    if (piece_type == PieceType.king):
-        return King(colour)
-    elif (piece_type == PieceType.queen):
-        return Queen(colour)
-    elif (piece_type == PieceType.bishop):
-        return Bishop(colour)
-    elif (piece_type == PieceType.knight):
-        return Knight(colour)
-    elif (piece_type == PieceType.rook):
-        return Rook(colour)
-    elif (piece_type == PieceType.pawn):
-        return Pawn(colour)
-    else:
-        return Piece()
+    try:
+        return _PIECES[(piece_type, colour)]
+    except KeyError:
+        return BLANK
 
 
 class Piece:
 
     """Represents a square on the board and the piece that stands on it.
 
+    Pieces are immutable: make_piece should be used rather than creating new
+    instances, so that equal pieces are usually the same object.
+
     Attributes:
         - colour:    a member of the PieceColour enum
         - piece_type:      a member of the PieceType enum
     """
 
+    __slots__ = ("type", "colour")
+
     def __init__(self):
         """Create a blank piece."""
-        self.type = PieceType.blank
-        self.colour = PieceColour.blank
+        self._set(PieceType.blank, PieceColour.blank)
+
+    def _set(self, piece_type, colour):
+        object.__setattr__(self, "type", piece_type)
+        object.__setattr__(self, "colour", colour)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Pieces are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Pieces are immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (make_piece, (self.type, self.colour))
 
     def draw(self, canvas, x, y):
         """Draw the piece
@@ -77,12 +95,17 @@ class Piece:
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __hash__(self):
+        return hash((self.type, self.colour))
+
     def get_san(self):
         return "_"
 
 
 class King(Piece):
 
+    __slots__ = ()
+
     def __init__(self, colour):
         """Create a king piece with the passed colour.
 
@@ -90,8 +113,7 @@ class King(Piece):
             - colour:  a member of the PieceColour enum
         """
 
-        self.colour = colour
-        self.type = PieceType.king
+        self._set(PieceType.king, colour)
 
     def draw(self, canvas, x, y):
         """Draw the piece
@@ -119,6 +141,8 @@ class King(Piece):
 
 class Queen(Piece):
 
+    __slots__ = ()
+
     def __init__(self, colour):
         """Create a queen piece with the passed colour.
 
@@ -126,8 +150,7 @@ class Queen(Piece):
             - colour:  a member of the PieceColour enum
         """
 
-        self.colour = colour
-        self.type = PieceType.queen
+        self._set(PieceType.queen, colour)
 
     def draw(self, canvas, x, y):
         """Draw the piece
@@ -154,6 +177,8 @@ class Queen(Piece):
 
 class Bishop(Piece):
 
+    __slots__ = ()
+
     def __init__(self, colour):
         """Create a bishop piece with the passed colour.
 
@@ -161,8 +186,7 @@ class Bishop(Piece):
             - colour:  a member of the PieceColour enum
         """
 
-        self.colour = colour
-        self.type = PieceType.bishop
+        self._set(PieceType.bishop, colour)
 
     def draw(self, canvas, x, y):
         """Draw the piece
@@ -190,6 +214,8 @@ class Bishop(Piece):
 
 class Knight(Piece):
 
+    __slots__ = ()
+
     def __init__(self, colour):
         """Create a knight piece with the passed colour.
 
@@ -197,8 +223,7 @@ class Knight(Piece):
             - colour:  a member of the PieceColour enum
         """
 
-        self.colour = colour
-        self.type = PieceType.knight
+        self._set(PieceType.knight, colour)
 
     def draw(self, canvas, x, y):
         """Draw the piece
@@ -226,6 +251,8 @@ class Knight(Piece):
 
 class Rook(Piece):
 
+    __slots__ = ()
+
     def __init__(self, colour):
         """Create a rook piece with the passed colour.
 
@@ -233,8 +260,7 @@ class Rook(Piece):
             - colour:  a member of the PieceColour enum
         """
 
-        self.colour = colour
-        self.type = PieceType.rook
+        self._set(PieceType.rook, colour)
 
     def draw(self, canvas, x, y):
         """Draw the piece
@@ -262,6 +288,8 @@ class Rook(Piece):
 
 class Pawn(Piece):
 
+    __slots__ = ()
+
     def __init__(self, colour):
         """Create a pawn piece with the passed colour.
 
@@ -269,8 +297,7 @@ class Pawn(Piece):
             - colour:  a member of the PieceColour enum
         """
 
-        self.colour = colour
-        self.type = PieceType.pawn
+        self._set(PieceType.pawn, colour)
 
     def draw(self, canvas, x, y):
         """Draw the piece
@@ -294,3 +321,13 @@ class Pawn(Piece):
             return "P"
         else:
             return "p"
+
+
+BLANK = Piece()
+
+_PIECES = {(PieceType.blank, PieceColour.blank): BLANK}
+
+for _colour in (PieceColour.white, PieceColour.black):
+    for _piece_class in (King, Queen, Bishop, Knight, Rook, Pawn):
+        _piece = _piece_class(_colour)
+        _PIECES[(_piece.type, _colour)] = _piece
@@ -1,6 +1,7 @@
 """Contains the Player class"""
 
 import importlib
+import inspect
 import Gamestate
 import Board
 import Move
@@ -47,8 +48,13 @@ class Player:
             raise ValueError(
                 "Cannot have both is_human=False and location=None")
 
-    def get_move(self, game_state):
-        """Virtual function: should return a legal move given a game state."""
+    def get_move(self, game_state, deadline=None):
+        """Virtual function: should return a legal move given a game state.
+
+        deadline is the time.perf_counter() value by which the move should
+        be chosen, or None for no limit.
+
+        """
         raise NotImplementedError
 
     def get_promotion(self, game_state):
@@ -76,12 +82,13 @@ class HumanPlayer(Player):
 
         super(HumanPlayer, self).__init__(colour, is_human=True)
 
-    def get_move(self, game_state):
+    def get_move(self, game_state, deadline=None):
         """Display available moves and returns the move the user picked.
 
         Args:
             - game_state:  an instance of GameState - the human will choose
                            their move based on this
+            - deadline:  ignored - humans take as long as they like
 
         """
 
@@ -118,15 +125,31 @@ class AIPlayer(Player):
 
         self.AI = importlib.import_module("Scripts." + location)
 
-    def get_move(self, game_state):
+        # Only AI modules whose get_move takes a deadline are passed one, so
+        # older modules work unchanged
+        parameters = inspect.signature(self.AI.get_move).parameters.values()
+        self.takes_deadline = any(
+            parameter.name == "deadline"
+            or parameter.kind == inspect.Parameter.VAR_KEYWORD
+            for parameter in parameters)
+
+    def get_move(self, game_state, deadline=None):
         """Return the move chosen by the AI module
 
         Args:
             - game_state:  an instance of GameState - the AI will choose
                            their move based on this
+            - deadline:  the time.perf_counter() value by which the move
+                         should be chosen, or None for no limit. It is
+                         passed on to the AI module's get_move as the
+                         keyword argument deadline, if it takes one.
 
         """
 
+        if self.takes_deadline and deadline is not None:
+            return self.AI.get_move(game_state, self.colour,
+                                    deadline=deadline)
+
         return self.AI.get_move(game_state, self.colour)
 
     def get_promotion(self, game_state):
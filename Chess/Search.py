@@ -0,0 +1,390 @@
+"""Contains the Search class, an alpha-beta search that AIs can share
+
+A Script AI can pick its move with a few lines, eg.
+
+    from Chess import Evaluation
+    from Chess import Search
+
+    # One search for the whole game, so its transposition table and move
+    # ordering carry over from one move to the next
+    search = Search.Search(Evaluation.Evaluator().evaluate)
+
+    def get_move(game_state, colour, deadline=None):
+        return search.search(game_state, 3, deadline)
+
+and pass its own evaluation function to Search to change how it plays.
+
+"""
+
+import time
+import Move
+import MoveOrdering
+import TranspositionTable as tt
+from Piece import PieceColour as colour
+
+# A score beyond any evaluation, for a side which has been checkmated. Mates
+# found sooner score further from zero, so the quickest one is preferred.
+MATE_SCORE = 100000
+INFINITY = 1000000
+
+# Scores beyond this are mates. They are stored in the transposition table
+# as the distance to mate from the stored position, not from the root.
+MATE_BOUND = MATE_SCORE - 1000
+
+# The clock is checked against the deadline once in this many nodes
+CHECK_TIME_NODES = 64
+
+
+def default_evaluate(board, eval_colour):
+    """Return the Board.score of a board from eval_colour's side."""
+    return eval_colour*board.score
+
+
+class Search:
+
+    """A negamax alpha-beta search with iterative deepening.
+
+    The search plays moves forward and back on the game state it is given
+    with Gamestate.push and pop, so the game state is left as it was found.
+    Moves are tried in the order given by a MoveOrdering, and pawns
+    reaching the back rank are always promoted to queens.
+
+    At the end of the search, captures and promotions are searched until
+    the position is quiet (quiescence search), so that a piece is not
+    counted as won when it can be taken straight back. Captures which
+    lose material by static exchange evaluation (see Board.see) are left
+    out of the quiescence search.
+
+    Results are kept in a TranspositionTable between searches. A position
+    found in the table is not searched again if it was searched deeply
+    enough, and otherwise its best move (the hash move) is searched first.
+
+    Attributes:
+        - evaluate:  the function used to score positions at the end of
+                     the search. It is passed a Board and a colour, and
+                     should return a score in centipawns from that colour's
+                     side.
+        - nodes:  the number of positions visited by the last search
+        - quiescence_nodes:  the number of those in the quiescence search
+        - depth:  the depth of the last iteration the last search completed
+        - score:  the score of the best move found, from the point of view
+                  of the side to move
+        - best_move:  the best move found by the last search
+        - elapsed:  the time taken by the last search, in seconds
+        - table:  the TranspositionTable
+        - table_cutoffs:  the number of positions in the last search whose
+                          score was taken from the table
+        - stopped:  true if the last search ran out of time
+        - ordering:  the MoveOrdering, which also counts the cutoffs of the
+                     last search
+
+    """
+
+    def __init__(self, evaluate=default_evaluate, table=None, ordering=None):
+        """Create a search which scores positions with evaluate.
+
+        Args:
+            - evaluate:  see Attributes
+            - table:  a TranspositionTable, which may be shared with other
+                      searches. By default a new one is made.
+            - ordering:  a MoveOrdering. By default a new one is made.
+
+        """
+
+        self.evaluate = evaluate
+        self.table = (tt.TranspositionTable() if table is None
+                      else table)
+        self.table_cutoffs = 0
+        self.ordering = (MoveOrdering.MoveOrdering() if ordering is None
+                         else ordering)
+
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.best_move = None
+        self.elapsed = 0
+        self.stopped = False
+        self._deadline = None
+
+    def search(self, game_state, max_depth, deadline=None):
+        """Return the best move for the side to move in a game state.
+
+        The position is searched to depth 1, then 2, and so on up to
+        max_depth, starting each iteration with the best move of the last.
+
+        With a deadline, no new iteration is started once half the time
+        left at the start has gone, as the next would most likely not
+        finish. An iteration still running at the deadline is abandoned,
+        and the best move of the last complete one is returned (or the
+        best found so far, if the first was not completed).
+
+        Args:
+            - game_state:  a Gamestate
+            - max_depth:  the number of half moves to look ahead
+            - deadline:  a time.perf_counter() value to stop searching by,
+                         or None to always search to max_depth
+
+        """
+
+        start = time.perf_counter()
+
+        self._deadline = deadline
+        self.stopped = False
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.best_move = None
+        self.table_cutoffs = 0
+        self.table.new_search()
+        self.ordering.new_search()
+
+        for depth in range(1, max_depth + 1):
+            move, score = self._search_root(game_state, depth)
+
+            if self.stopped:
+                if self.best_move is None:
+                    self.best_move = move
+                break
+
+            if move is None:
+                break
+
+            self.best_move = move
+            self.score = score
+            self.depth = depth
+
+            # No need to look deeper once a forced mate has been found
+            if abs(score) > MATE_BOUND:
+                break
+
+            if (deadline is not None and time.perf_counter() - start
+                    > (deadline - start) / 2):
+                break
+
+        self.elapsed = time.perf_counter() - start
+
+        return self.best_move
+
+    def summary(self):
+        """Return a line describing the last search."""
+
+        return ("depth {} score {} nodes {} ({} quiescence) time {:.2f}s"
+                " ({:.0f} nodes/s) table cutoffs {}, {:.1%} hits,"
+                " {:.1%} of cutoffs by first move"
+                .format(self.depth, self.score, self.nodes,
+                        self.quiescence_nodes, self.elapsed,
+                        self.nodes/max(self.elapsed, 1e-9),
+                        self.table_cutoffs, self.table.hit_rate(),
+                        self.ordering.first_move_cutoff_rate()))
+
+    def _search_root(self, game_state, depth):
+        """Search every move of the root position to depth and return the
+        best move and its score.
+
+        If time runs out, the best of the moves searched so far is
+        returned, or the first move if none were.
+
+        """
+
+        turn = colour.white if game_state.is_white_turn else colour.black
+
+        # The best move from the last iteration (or, on the first, from
+        # the table) is searched first, so the others are cut off as
+        # quickly as possible
+        hash_code = 0
+        if self.best_move is not None:
+            hash_code = self.best_move.code
+        else:
+            entry = self.table.probe(game_state.hash)
+            if entry is not None:
+                hash_code = entry[3]
+
+        moves = list(self.ordering.iter_moves(game_state, turn, 0,
+                                              hash_code))
+
+        best_move = None
+        alpha = -INFINITY
+
+        for move in moves:
+            game_state.push(move)
+            score = -self._negamax(game_state, depth - 1, -INFINITY, -alpha,
+                                   1)
+            game_state.pop()
+
+            if self.stopped:
+                return best_move or move, alpha
+
+            if score > alpha:
+                alpha = score
+                best_move = move
+
+        if best_move is not None:
+            self.table.store(game_state.hash, depth, alpha, tt.EXACT,
+                             best_move.code)
+
+        return best_move, alpha
+
+    def _negamax(self, game_state, depth, alpha, beta, ply):
+        """Return the score of a position from the point of view of the
+        side to move, searching depth half moves ahead.
+
+        Scores at or below alpha only show that the position is no better
+        than alpha, and scores at or above beta that it is no worse than
+        beta (fail-hard alpha-beta).
+
+        """
+
+        if depth <= 0:
+            return self._quiesce(game_state, alpha, beta, ply)
+
+        if self._is_over(game_state):
+            return 0
+
+        turn = colour.white if game_state.is_white_turn else colour.black
+        key = game_state.hash
+        hash_code = 0
+        entry = self.table.probe(key)
+
+        if entry is not None:
+            entry_depth, score, bound, hash_code = entry
+
+            if entry_depth >= depth:
+                score = _score_from_table(score, ply)
+
+                if (bound == tt.EXACT or (bound == tt.LOWER and score >= beta)
+                        or (bound == tt.UPPER and score <= alpha)):
+                    self.table_cutoffs += 1
+                    return min(max(score, alpha), beta)
+
+        best_code = 0
+        raised_alpha = False
+        move_number = -1
+
+        for move_number, move in enumerate(self.ordering.iter_moves(
+                game_state, turn, ply, hash_code)):
+            game_state.push(move)
+            score = -self._negamax(game_state, depth - 1, -beta, -alpha,
+                                   ply + 1)
+            game_state.pop()
+
+            if self.stopped:
+                return 0
+
+            if score >= beta:
+                self.ordering.record_cutoff(game_state, move, ply, depth,
+                                            move_number)
+                self.table.store(key, depth, _score_to_table(beta, ply),
+                                 tt.LOWER, move.code)
+                return beta
+            if score > alpha:
+                alpha = score
+                best_code = move.code
+                raised_alpha = True
+
+        if move_number < 0:
+            if game_state.board.is_in_check(turn):
+                return -MATE_SCORE + ply
+            return 0
+
+        self.table.store(key, depth, _score_to_table(alpha, ply),
+                         tt.EXACT if raised_alpha else tt.UPPER, best_code)
+
+        return alpha
+
+    def _quiesce(self, game_state, alpha, beta, ply):
+        """Return the score of a position from the point of view of the side
+        to move, searching only captures and promotions.
+
+        The side to move may instead "stand pat" and take the evaluation of
+        the position as it is, since it need not capture. Captures losing
+        material by static exchange evaluation are not searched. A side in
+        check may not stand pat: every move out of check is searched, so
+        that a mate at the end of the search is scored as one.
+
+        """
+
+        if self._is_over(game_state):
+            return 0
+
+        self.quiescence_nodes += 1
+
+        turn = colour.white if game_state.is_white_turn else colour.black
+        board = game_state.board
+
+        if board.is_in_check(turn):
+            moves = game_state.get_all_moves(turn)
+
+            if not moves:
+                return -MATE_SCORE + ply
+
+        else:
+            score = self.evaluate(board, turn)
+
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+
+            stages = board.iter_code_stages(turn)
+            codes = [code for code in next(stages) + next(stages)
+                     if board.see(code) >= 0]
+
+            from_code = Move.Move.from_code
+            moves = [from_code(code) for code in codes]
+            moves += game_state.get_en_passant_moves(turn)
+
+        for move in moves:
+            game_state.push(move)
+            score = -self._quiesce(game_state, -beta, -alpha, ply + 1)
+            game_state.pop()
+
+            if self.stopped:
+                return 0
+
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+
+        return alpha
+
+    def _is_over(self, game_state):
+        """Count a visit to a position, and return true if it should score
+        0: either because time has run out, or because it is a draw by
+        repetition, the fifty move rule or insufficient material."""
+
+        self.nodes += 1
+
+        if (self._deadline is not None
+                and not self.nodes % CHECK_TIME_NODES
+                and time.perf_counter() >= self._deadline):
+            self.stopped = True
+
+        # Unwind without storing anything once time has run out
+        return (self.stopped or game_state.is_repetition(2)
+                or game_state.fifty_move_count >= 100
+                or game_state.board.is_insufficient_material())
+
+
+def _score_to_table(score, ply):
+    """Return a score found ply half moves from the root as it should be
+    stored in the transposition table."""
+
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    """Return a score from the transposition table as seen from ply half
+    moves from the root (the reverse of _score_to_table)."""
+
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
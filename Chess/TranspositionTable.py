@@ -0,0 +1,190 @@
+"""Contains the TranspositionTable class, a fixed-size cache of search results
+
+The same position is often reached by different orders of the same moves (a
+transposition). A search can store what it learnt about each position in
+the table, keyed by Gamestate.hash, and use it when the position comes up
+again rather than searching it a second time.
+
+"""
+
+import array
+
+# Bound types: whether a stored score is exact, or only shows that the
+# position is at least (LOWER) or at most (UPPER) as good as the score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Array typecodes for each field of an entry
+_KEY_TYPE = "Q"
+_DEPTH_TYPE = "h"
+_SCORE_TYPE = "i"
+_BOUND_TYPE = "B"
+_MOVE_TYPE = "I"
+_AGE_TYPE = "B"
+
+# Bytes taken by one entry across the arrays
+ENTRY_SIZE = sum(array.array(typecode).itemsize
+                 for typecode in (_KEY_TYPE, _DEPTH_TYPE, _SCORE_TYPE,
+                                  _BOUND_TYPE, _MOVE_TYPE, _AGE_TYPE))
+
+# Entries in each bucket: one kept for the deepest search of the positions
+# that share the bucket, and one which always takes the latest
+BUCKET_SIZE = 2
+
+DEFAULT_MEGABYTES = 16
+
+
+class TranspositionTable:
+
+    """A hash table of search results held in preallocated arrays.
+
+    Each entry holds a position's 64 bit hash, the depth it was searched
+    to, its score, the bound type of the score, the code (see Move.encode)
+    of the best move found, or 0, and the search it was stored in. The
+    fields are held in parallel arrays, one per field, so the table takes a
+    fixed amount of memory however many positions are stored.
+
+    Positions are shared out between buckets of two entries by their hash.
+    A position already in its bucket has its entry updated, unless the
+    entry holds a deeper result from the current search (see new_search).
+    Otherwise, the first entry of a bucket is only replaced by a search at
+    least as deep, unless it was stored by an earlier search; the second
+    is replaced by every store that does not go in the first.
+
+    Attributes:
+        - size:  the number of entries in the table
+        - probes:  the number of calls to probe
+        - hits:  the number of probes which found their position
+        - stores:  the number of calls to store
+
+    """
+
+    def __init__(self, megabytes=DEFAULT_MEGABYTES):
+        """Create an empty table taking up to the passed number of megabytes.
+
+        The number of buckets is rounded down to a power of two, so the
+        bucket of a hash can be found with a mask.
+
+        Raises:
+            - ValueError if megabytes is too small to hold one bucket
+
+        """
+
+        buckets = int(megabytes*1024*1024) // (ENTRY_SIZE*BUCKET_SIZE)
+
+        if buckets < 1:
+            raise ValueError("Table of " + str(megabytes)
+                             + " MB is too small")
+
+        # Largest power of two no more than buckets
+        buckets = 1 << (buckets.bit_length() - 1)
+
+        self.size = buckets*BUCKET_SIZE
+        self._mask = buckets - 1
+        self._age = 0
+
+        self._keys = array.array(_KEY_TYPE, [0])*self.size
+        # Empty entries have a depth of -1, so are never found
+        self._depths = array.array(_DEPTH_TYPE, [-1])*self.size
+        self._scores = array.array(_SCORE_TYPE, [0])*self.size
+        self._bounds = array.array(_BOUND_TYPE, [0])*self.size
+        self._moves = array.array(_MOVE_TYPE, [0])*self.size
+        self._ages = array.array(_AGE_TYPE, [0])*self.size
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        """Empty the table and reset its statistics."""
+
+        self.__init__(self.megabytes)
+
+    @property
+    def megabytes(self):
+        """The memory taken by the table's arrays, in megabytes."""
+        return self.size*ENTRY_SIZE / (1024*1024)
+
+    def new_search(self):
+        """Mark entries stored from now on as belonging to a new search, so
+        that the deep results of old searches give way to new ones."""
+
+        self._age = (self._age + 1) & 255
+
+    def probe(self, key):
+        """Return (depth, score, bound, move code) stored for a position
+        hash, or None if it is not in the table."""
+
+        self.probes += 1
+        index = (key & self._mask) * BUCKET_SIZE
+
+        for slot in (index, index + 1):
+            if self._keys[slot] == key and self._depths[slot] >= 0:
+                self.hits += 1
+                return (self._depths[slot], self._scores[slot],
+                        self._bounds[slot], self._moves[slot])
+
+        return None
+
+    def store(self, key, depth, score, bound, move_code=0):
+        """Store the result of searching a position.
+
+        Args:
+            - key:  the position's hash
+            - depth:  the number of half moves it was searched to
+            - score:  its score, from the side to move's point of view
+            - bound:  EXACT, LOWER or UPPER
+            - move_code:  the code of the best move found, or 0. If 0 and
+                          the position is already stored, its move is kept.
+
+        """
+
+        self.stores += 1
+        slot = (key & self._mask) * BUCKET_SIZE
+
+        for old_slot in (slot, slot + 1):
+            if self._keys[old_slot] == key and self._depths[old_slot] >= 0:
+                # The position is already stored, so its entry is updated
+                # rather than a second one added. A deeper result from the
+                # current search is kept.
+                if (depth < self._depths[old_slot]
+                        and self._ages[old_slot] == self._age):
+                    return
+
+                # Keep the move from an earlier search of the position
+                if not move_code:
+                    move_code = self._moves[old_slot]
+
+                slot = old_slot
+                break
+
+        else:
+            # The first entry keeps the deepest result of the current search
+            if depth < self._depths[slot] and self._ages[slot] == self._age:
+                slot += 1
+
+        self._keys[slot] = key
+        self._depths[slot] = depth
+        self._scores[slot] = score
+        self._bounds[slot] = bound
+        self._moves[slot] = move_code
+        self._ages[slot] = self._age
+
+    def hit_rate(self):
+        """Return the fraction of probes which found their position."""
+        return self.hits / self.probes if self.probes else 0
+
+    def usage(self):
+        """Return the fraction of entries in use."""
+        return (self.size - self._depths.count(-1)) / self.size
+
+    def summary(self):
+        """Return a line describing the table's statistics."""
+
+        return ("{:.1f} MB, {} probes, {:.1%} hits, {} stores, {:.1%} full"
+                .format(self.megabytes, self.probes, self.hit_rate(),
+                        self.stores, self.usage()))
@@ -0,0 +1,34 @@
+"""Contains the random keys used to hash positions (Zobrist hashing)
+
+A position's hash is the XOR of the keys for each piece on its square, for
+the side to move, for each castling right still held and for the file of
+the en passant square. Making a move changes only a few of these, so the
+hash can be kept up to date by XORing keys in and out as the position
+changes.
+
+"""
+
+import random
+
+# A fixed seed keeps hashes the same from one run to the next
+_random = random.Random(0x4A4A4368657373)
+
+
+def _key():
+    return _random.getrandbits(64)
+
+# Keys for a piece on a square, indexed [colour][piece type][square] like
+# Board.piece_bb, with square x + 8*y. Keys for PieceType.blank are zero.
+PIECE_KEYS = [None,
+              [[0]*64] + [[_key() for sq in range(64)] for i in range(6)],
+              [[0]*64] + [[_key() for sq in range(64)] for i in range(6)]]
+
+BLACK_TO_MOVE = _key()
+
+W_CASTLE_K = _key()
+W_CASTLE_Q = _key()
+B_CASTLE_K = _key()
+B_CASTLE_Q = _key()
+
+# Keys for the en passant square, indexed by its x coordinate
+EN_PASSANT_KEYS = [_key() for x in range(8)]
@@ -0,0 +1,147 @@
+"""Count the positions reachable from a position (perft) to test and time
+move generation.
+
+perft(depth) is the number of move sequences of the given length, with each
+promotion piece counted as a different move. The counts for the reference
+positions below are well known, so a wrong count shows a bug in move
+generation or make/unmake, and the time taken shows how fast they are.
+
+Run from this directory:
+    python perft.py [depth]           check the reference positions
+    python perft.py depth "<fen>"     divide a position by its first moves
+
+"""
+
+import sys
+import time
+import Gamestate
+from Piece import PieceColour as colour
+from Piece import PieceType as p_type
+
+# (name, FEN, node counts for depth 1, 2, ...)
+POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     (20, 400, 8902, 197281, 4865609)),
+    ("kiwipete",
+     "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     (48, 2039, 97862, 4085603)),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     (14, 191, 2812, 43238, 674624)),
+    ("position 4",
+     "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     (6, 264, 9467, 422333)),
+    ("position 5",
+     "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     (44, 1486, 62379, 2103487)),
+    ("position 6",
+     "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1"
+     " w - - 0 10",
+     (46, 2079, 89890, 3894594)),
+]
+
+_PROMOTION_LETTERS = {p_type.queen: "q", p_type.rook: "r",
+                      p_type.bishop: "b", p_type.knight: "n"}
+
+
+def move_str(move):
+    """Return a move in coordinate notation, eg. e2e4 or a7a8q."""
+
+    string = ""
+    for x, y in (move.start_posn, move.end_posn):
+        string += chr(ord("a") + x) + str(8 - y)
+
+    if move.promotion:
+        string += _PROMOTION_LETTERS[move.promotion]
+
+    return string
+
+
+def perft(game_state, depth):
+    """Return the number of move sequences of length depth from the
+    position, playing each on game_state and taking it back again.
+    """
+
+    if depth == 0:
+        return 1
+
+    turn = colour.white if game_state.is_white_turn else colour.black
+    moves = game_state.get_all_moves(turn, promotions=True)
+
+    # The moves are all legal, so the last ply need not be played out
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        game_state.push(move)
+        nodes += perft(game_state, depth - 1)
+        game_state.pop()
+
+    return nodes
+
+
+def divide(game_state, depth):
+    """Return a dict of the perft(depth - 1) count after each legal move,
+    keyed by the move in coordinate notation. Comparing this with another
+    program's divide narrows a wrong perft count down to a single move.
+    """
+
+    turn = colour.white if game_state.is_white_turn else colour.black
+    counts = {}
+
+    for move in game_state.get_all_moves(turn, promotions=True):
+        game_state.push(move)
+        counts[move_str(move)] = perft(game_state, depth - 1)
+        game_state.pop()
+
+    return counts
+
+
+def run_positions(max_depth=3):
+    """Check perft for each reference position up to max_depth, printing
+    each count and the nodes per second. Return true if all were correct.
+    """
+
+    all_correct = True
+    total_nodes = 0
+    total_time = 0
+
+    for name, fen, expected in POSITIONS:
+        game_state = Gamestate.Gamestate(fen)
+
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            start = time.perf_counter()
+            nodes = perft(game_state, depth)
+            elapsed = time.perf_counter() - start
+
+            total_nodes += nodes
+            total_time += elapsed
+
+            correct = nodes == expected[depth - 1]
+            all_correct = all_correct and correct
+
+            print("{:<11} depth {}: {:>9} nodes {:>8.2f}s {:>9.0f} nps  {}"
+                  .format(name, depth, nodes, elapsed,
+                          nodes/max(elapsed, 1e-9),
+                          "ok" if correct else
+                          "WRONG (expected {})".format(expected[depth - 1])))
+
+    print("total: {} nodes in {:.2f}s, {:.0f} nps".format(
+        total_nodes, total_time, total_nodes/max(total_time, 1e-9)))
+
+    return all_correct
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 2:
+        game_state = Gamestate.Gamestate(sys.argv[2])
+        counts = divide(game_state, int(sys.argv[1]))
+
+        for move in sorted(counts):
+            print(move, counts[move])
+        print("total:", sum(counts.values()))
+
+    else:
+        depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+        sys.exit(0 if run_positions(depth) else 1)
@@ -2,10 +2,13 @@ from Chess import Gamestate
 from Chess import Board
 from Chess import Move
 from Chess import Piece
+from Chess import Evaluation
 from Chess.Piece import PieceColour as p_colour
-from Chess.Piece import PieceType
 import random
 
+# Piece values in pawns, indexed by PieceType
+PIECE_VALUES = (0, 0, 9, 3, 3, 5, 1)
+
 
 def get_move(game_state, colour):
     """Return the move chosen by the AI module
@@ -22,7 +25,7 @@ def get_move(game_state, colour):
 
     cur_best_move = None
 
-    if(colour.value == p_colour.white.value):
+    if(colour == p_colour.white):
         cur_eval = -1000
 
         for m in moves:
@@ -66,43 +69,11 @@ def get_move(game_state, colour):
 
 def board_eval(board, colour):
 
-    eval = 0
-
-    for i in range(8):
-        for j in range(8):
-
-            piece = board.get_piece(i,j)
-
-            piece_type = piece.type
-            piece_col = piece.colour
-
-            if (piece_type.value == PieceType.queen.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 9
-                else:
-                    eval -= 9
-            elif (piece_type.value == PieceType.bishop.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 3
-                else:
-                    eval -= 3
-            elif (piece_type.value == PieceType.knight.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 3
-                else:
-                    eval -= 3
-            elif (piece_type.value == PieceType.rook.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 5
-                else:
-                    eval -= 5
-            elif (piece_type.value == PieceType.pawn.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 1
-                else:
-                    eval -= 1
-
-    if colour.value == p_colour.white.value:
+    # Material is read from the board's piece counts rather than by
+    # looking at every square
+    eval = Evaluation.material(board, PIECE_VALUES)
+
+    if colour == p_colour.white:
         if(board.is_in_check(p_colour.black)):
 
             eval += 2
@@ -114,7 +85,6 @@ def board_eval(board, colour):
     return eval
 
 
-
 def get_promotion(game_state, colour):
     """Return the piece the user chooses to promote their pawn to.
 
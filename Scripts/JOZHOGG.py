@@ -2,12 +2,14 @@ from Chess import Gamestate
 from Chess import Board
 from Chess import Move
 from Chess import Piece
-from Chess.Piece import PieceColour as p_colour
-from Chess.Piece import PieceType
-import random
+from Chess import Evaluation
+from Chess import Search
 
+# Number of half moves looked ahead
+SEARCH_DEPTH = 3
 
-def get_move(game_state, colour, step=0):
+
+def get_move(game_state, colour, deadline=None):
     """Return the move chosen by the AI module
 
     Args:
@@ -15,113 +17,23 @@ def get_move(game_state, colour, step=0):
                        their move based on this
         - colour:  an member of the Chess.Piece.PieceColour enum, the colour
                    the player for which a move is to be chosen.
+        - deadline:  the time.perf_counter() value by which the move must be
+                     chosen, or None for no limit
 
     """
 
-    if(colour.value == p_colour.white.value):
-        enemy_col = p_colour.black    
-    else:
-        enemy_col = p_colour.white 
-
-    moves = game_state.get_all_moves(colour)
-
-    cur_best_move = None
-
-    if(colour.value == p_colour.white.value):
-        cur_eval = -1000
-
-        for m in moves:
-
-            taken_piece = game_state.board.get_piece(*m.end_posn)
-
-            game_state.board.make_move(m)
-            tmp_eval = board_eval(game_state.board, colour)
-
-            step += 1
-
-            get_move(game_state, enemy_col, step)
-
-            if(random.random() > 0.5):
-                tmp_eval += 0.5
-
-            if(tmp_eval > cur_eval):
-
-                cur_best_move = m
-                cur_eval = tmp_eval
-
-            game_state.board.takeback_move(m, taken_piece)
-
-    else:
-        cur_eval = 1000
-
-        for m in moves:
+    return search.search(game_state, SEARCH_DEPTH, deadline)
 
-            taken_piece = game_state.board.get_piece(*m.end_posn)
-
-            game_state.board.make_move(m)
-            tmp_eval = board_eval(game_state.board, colour)
-
-            if(random.random() > 0.5):
-                tmp_eval -= 0.5
-
-            if(tmp_eval < cur_eval):
-
-                cur_best_move = m
-                cur_eval = tmp_eval
-
-            game_state.board.takeback_move(m, taken_piece)
-    if
-    return cur_best_move
 
 def board_eval(board, colour):
+    """Return the material balance in centipawns from colour's side.
 
-    eval = 0
-
-    for i in range(8):
-        for j in range(8):
-
-            piece = board.get_piece(i,j)
-
-            piece_type = piece.type
-            piece_col = piece.colour
+    Checks are left to the search, which only evaluates positions where
+    the side to move is not in check (see Search._quiesce).
 
-            if (piece_type.value == PieceType.queen.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 9
-                else:
-                    eval -= 9
-            elif (piece_type.value == PieceType.bishop.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 3
-                else:
-                    eval -= 3
-            elif (piece_type.value == PieceType.knight.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 3
-                else:
-                    eval -= 3
-            elif (piece_type.value == PieceType.rook.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 5
-                else:
-                    eval -= 5
-            elif (piece_type.value == PieceType.pawn.value):
-                if(piece_col.value == p_colour.white.value):
-                    eval += 1
-                else:
-                    eval -= 1
-
-    if colour.value == p_colour.white.value:
-        if(board.is_in_check(p_colour.black)):
-
-            eval += 2
-    else:
-        if(board.is_in_check(p_colour.white)):
-
-            eval -= 2
-
-    return eval
+    """
 
+    return colour*Evaluation.material(board)
 
 
 def get_promotion(game_state, colour):
@@ -135,4 +47,9 @@ def get_promotion(game_state, colour):
 
     """
 
-    return Piece.Queen(colour)
\ No newline at end of file
+    return Piece.Queen(colour)
+
+
+# Shared by every call of get_move, so that its transposition table keeps
+# what was learnt about positions from earlier moves
+search = Search.Search(board_eval)